@@ -18,20 +18,32 @@ from __future__ import annotations
 import sys
 import os
 import shutil
+import signal
 import subprocess
 import tempfile
+import textwrap
+import threading
 import uuid
 import time
 import random
+import atexit
+import bisect
+import codecs
 import webbrowser
 import zipfile
+import io
 import json
+import operator
+import mmap
 import re
 import getpass
 import fnmatch  # Added for pattern matching
+import functools
 import urllib.request
 import urllib.error
 import ssl
+import types
+import unicodedata
 from typing import List, Tuple, Any, Dict, Optional
 from pathlib import Path
 
@@ -67,6 +79,18 @@ except ImportError:
     messagebox = None
     HAS_TKINTER = False
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
 # ============================================================================
 # UPDATE CHECKER
 # ============================================================================
@@ -258,6 +282,49 @@ class Config:
 
 Config.init_directories()
 
+class VariableStore(dict):
+    """Variable (or alias) dictionary that bumps a version counter when its contents change"""
+    __slots__ = ("version",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        old = self.get(key, _MISSING)
+        if old is value or (type(old) is type(value) and old == value):
+            return
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self.version += 1
+        return super().pop(key, *default)
+
+    def popitem(self):
+        item = super().popitem()
+        self.version += 1
+        return item
+
+    def clear(self):
+        if self:
+            super().clear()
+            self.version += 1
+
 class State:
     """Application state management"""
     current_profile: str = "default"
@@ -265,10 +332,10 @@ class State:
 
     script_file: str = ""
     script_dir: str = ""
-    script_args: List[str] = []
+    script_args: Tuple[str, ...] = ()
 
-    aliases: Dict[str, str] = {}
-    variables: Dict[str, Any] = {}
+    aliases: Dict[str, str] = VariableStore()
+    variables: Dict[str, Any] = VariableStore()
     exported_vars: set = set()
     readonly_vars: set = set()
     
@@ -279,6 +346,7 @@ class State:
 
     loading_rc: bool = False
     plugin_registry: dict = {}
+    last_exit: int = 0  # mirrors $last, kept by set_last_exit
 
 # ============================================================================
 # EXCEPTIONS
@@ -334,6 +402,9 @@ def wait_for_any_key(prompt: str = "Press any key to continue . . .") -> None:
 class RCManager:
     """Manage .sigilrc profile files"""
 
+    # Profile name -> ((mtime_ns, size) of its RC file, state snapshot after loading it)
+    _loaded: Dict[str, Tuple[Tuple[int, int], dict]] = {}
+
     @staticmethod
     def get_rc_path(profile: Optional[str] = None) -> Path:
         """Get path to profile's RC file"""
@@ -415,6 +486,38 @@ class RCManager:
         finally:
             State.loading_rc = False
 
+    @staticmethod
+    def load_profile() -> None:
+        """Load current profile's RC file, reusing the last load if the file is unchanged"""
+        try:
+            st = os.stat(RCManager.get_rc_path())
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+
+        cached = RCManager._loaded.get(State.current_profile)
+        if stamp is not None and cached is not None and cached[0] == stamp:
+            snapshot = cached[1]
+            State.aliases.update(snapshot["aliases"])
+            State.variables.update(snapshot["variables"])
+            State.readonly_vars.update(snapshot["readonly"])
+            State.exported_vars.update(snapshot["exported"])
+            State.functions.update({name: list(body) for name, body in snapshot["functions"].items()})
+            for name in State.exported_vars:
+                if name in State.variables:
+                    os.environ[name] = str(State.variables[name])
+            return
+
+        RCManager.load()
+        if stamp is not None:
+            RCManager._loaded[State.current_profile] = (stamp, {
+                "aliases": dict(State.aliases),
+                "variables": dict(State.variables),
+                "readonly": set(State.readonly_vars),
+                "exported": set(State.exported_vars),
+                "functions": {name: list(body) for name, body in State.functions.items()},
+            })
+
 # ============================================================================
 # UNDO/BACKUP SYSTEM
 # ============================================================================
@@ -454,11 +557,212 @@ class UndoManager:
             State.undo_stack.pop(0)
         State.redo_stack.clear()
 
+    @staticmethod
+    def fast_move(src: Path, dst: Path) -> None:
+        """Move with a single rename when possible, falling back to shutil.move"""
+        # shutil.move moves *into* an existing directory; keep that behaviour
+        if not os.path.isdir(dst):
+            try:
+                os.replace(src, dst)
+                return
+            except OSError:
+                # e.g. EXDEV across filesystems; shutil.move copies instead
+                pass
+        shutil.move(str(src), str(dst))
+
     @staticmethod
     def safe_move(src: Path, dst: Path) -> None:
         """Safely move file, creating parent directories"""
         dst.parent.mkdir(parents=True, exist_ok=True)
-        shutil.move(str(src), str(dst))
+        UndoManager.fast_move(src, dst)
+
+# ============================================================================
+# LINE-ADDRESSED FILE WRITES
+# ============================================================================
+
+class LineFileWriter:
+    """Write a single numbered line of a file without rewriting all of it"""
+
+    # Per-path line index: path -> (mtime_ns, size, index); index is
+    # (line start offsets, ends with newline, newline bytes) or None, see _line_index
+    _index: Dict[str, Tuple[int, int, Optional[Tuple[List[int], bool, bytes]]]] = {}
+    COPY_CHUNK = 1024 * 1024
+    # Line breaks str.splitlines() honours besides \n and \r\n, as UTF-8
+    _OTHER_BREAKS = re.compile(rb"\r(?!\n)|[\x0b\x0c\x1c-\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+
+    @staticmethod
+    def _line_index(path: Path, st: os.stat_result) -> Optional[Tuple[List[int], bool, bytes]]:
+        """Return line start offsets, whether the last line is terminated, and the newline
+
+        Returns None when the file has line breaks other than \n and \r\n; lines
+        are numbered as str.splitlines() sees them, which a \n index cannot follow.
+        """
+        key = str(path)
+        cached = LineFileWriter._index.get(key)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        size = st.st_size
+        starts: List[int] = []
+        terminated = True
+        newline = b"\n"
+        index: Optional[Tuple[List[int], bool, bytes]] = None
+        if size:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if LineFileWriter._OTHER_BREAKS.search(mm) is None:
+                    starts.append(0)
+                    pos = mm.find(b"\n")
+                    if pos > 0 and mm[pos - 1] == 0x0D:
+                        newline = b"\r\n"
+                    while pos != -1 and pos + 1 < size:
+                        starts.append(pos + 1)
+                        pos = mm.find(b"\n", pos + 1)
+                    terminated = pos == size - 1
+                    index = (starts, terminated, newline)
+        else:
+            index = (starts, terminated, newline)
+
+        LineFileWriter._index[key] = (st.st_mtime_ns, size, index)
+        return index
+
+    @staticmethod
+    def _remember(path: Path, starts: List[int], terminated: bool, newline: bytes) -> None:
+        """Record the index for a file we just wrote"""
+        st = os.stat(path)
+        LineFileWriter._index[str(path)] = (st.st_mtime_ns, st.st_size, (starts, terminated, newline))
+
+    @staticmethod
+    def _rewrite(path: Path, line_num: int, text: str) -> None:
+        """Set a line by rewriting the whole file, numbering lines with str.splitlines()"""
+        LineFileWriter._index.pop(str(path), None)
+        lines = []
+        if path.exists():
+            lines = path.read_text(encoding="utf-8").splitlines()
+
+        # Ensure enough lines
+        while len(lines) < line_num:
+            lines.append("")
+
+        lines[line_num - 1] = text
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    @staticmethod
+    def _splice_replace(path: Path, start: int, end: int, data: bytes) -> None:
+        """Stream head + data + tail from `end` into a sibling file and swap it in"""
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                remaining = start
+                while remaining:
+                    chunk = src.read(min(remaining, LineFileWriter.COPY_CHUNK))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+                dst.write(data)
+                src.seek(end)
+                shutil.copyfileobj(src, dst, LineFileWriter.COPY_CHUNK)
+            shutil.copymode(path, tmp_name)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _splice_in_place(path: Path, start: int, end: int, data: bytes) -> None:
+        """Rewrite the file from `start` on with data + tail from `end`, then truncate"""
+        with open(path, "r+b") as f, tempfile.TemporaryFile() as tail:
+            f.seek(end)
+            shutil.copyfileobj(f, tail, LineFileWriter.COPY_CHUNK)
+            tail.seek(0)
+            f.seek(start)
+            f.write(data)
+            shutil.copyfileobj(tail, f, LineFileWriter.COPY_CHUNK)
+            f.truncate()
+
+    @staticmethod
+    def write_line(path: Path, line_num: int, text: str) -> None:
+        """Set 1-based line `line_num` of `path` to `text`, padding with empty lines"""
+        data = text.encode("utf-8")
+        if b"\n" in data or LineFileWriter._OTHER_BREAKS.search(data):
+            # The new text splits into several lines; let splitlines() renumber them
+            LineFileWriter._rewrite(path, line_num, text)
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+
+        if st is None:
+            starts, terminated, newline, size = [], True, b"\n", 0
+        else:
+            index = LineFileWriter._line_index(path, st)
+            if index is None:
+                LineFileWriter._rewrite(path, line_num, text)
+                return
+            starts, terminated, newline = index
+            size = st.st_size
+        count = len(starts)
+
+        if line_num > count:
+            # Appending: write only the new bytes at the end of the file, ending
+            # lines the way the file already does
+            lead = b"" if terminated else newline
+            pad = line_num - count - 1
+            first_pad = size + len(lead)
+            step = len(newline)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(lead + newline * pad + data + newline)
+            starts = starts + list(range(first_pad, first_pad + pad * step + 1, step))
+            LineFileWriter._remember(path, starts, True, newline)
+            return
+
+        if not terminated:
+            # Written files always end with a newline, as a full rewrite leaves them
+            with open(path, "ab") as f:
+                f.write(newline)
+            size += len(newline)
+
+        index = line_num - 1
+        start = starts[index]
+        # Offset of the terminating newline
+        line_end = starts[index + 1] - 1 if index + 1 < count else size - 1
+
+        with open(path, "r+b") as f:
+            f.seek(start)
+            old = f.read(line_end - start)
+            # Leave a CRLF's \r with the terminator
+            content_end = line_end - 1 if old.endswith(b"\r") else line_end
+            same_length = content_end - start == len(data)
+            if same_length:
+                # Same length: patch the line in place
+                f.seek(start)
+                f.write(data)
+        if same_length:
+            LineFileWriter._remember(path, starts, True, newline)
+            return
+
+        # Length changed. A replacement file is a new inode, which would split
+        # hardlinks and could not keep another user's ownership, ACLs or xattrs
+        owner = os.getuid() if hasattr(os, "getuid") else st.st_uid
+        try:
+            if st.st_nlink > 1 or st.st_uid != owner:
+                LineFileWriter._splice_in_place(path, start, content_end, data)
+            else:
+                LineFileWriter._splice_replace(path, start, content_end, data)
+        except BaseException:
+            LineFileWriter._index.pop(str(path), None)
+            raise
+
+        delta = len(data) - (content_end - start)
+        starts = starts[:index + 1] + [offset + delta for offset in starts[index + 1:]]
+        LineFileWriter._remember(path, starts, True, newline)
 
 # ============================================================================
 # TEXT PROCESSING
@@ -468,6 +772,12 @@ class TextProcessor:
     """Handle tokenization, comment stripping, variable expansion"""
 
     _varname_re = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+    # Characters that make expand_aliases_and_vars do more than alias and bare-name lookups
+    _expansion_chars_re = re.compile(r'[$\'"\\]')
+    # Expanded tokens keyed by (alias version, variable version, line); commands that touch
+    # the environment also set the matching variable, so the versions cover it too
+    _line_tokens: Dict[Tuple[int, int, str], Tuple[str, ...]] = {}
+    LINE_CACHE_SIZE = 4096
 
     @staticmethod
     def tokenize(line: str) -> List[str]:
@@ -664,6 +974,31 @@ class TextProcessor:
 
         return " ".join(expanded_tokens)
 
+    @staticmethod
+    def expand_and_tokenize(line: str) -> Tuple[str, ...]:
+        """Expand aliases and variables in line and tokenize it, memoized per alias/variable version"""
+        key = (State.aliases.version, State.variables.version, line)
+        tokens = TextProcessor._line_tokens.get(key)
+        if tokens is None:
+            if TextProcessor._expansion_chars_re.search(line) is None:
+                # Without $, quotes or backslashes only aliases and bare variable names
+                # expand; when no word is either, the words are the tokens
+                words = line.split()
+                variables = State.variables
+                if not words or (words[0] not in State.aliases
+                                 and not any(word in variables for word in words)):
+                    tokens = words
+            if tokens is None:
+                tokens = TextProcessor.tokenize(TextProcessor.expand_aliases_and_vars(line))
+            if tokens:
+                # interned command names hit COMMAND_REGISTRY keys by identity
+                tokens[0] = sys.intern(tokens[0])
+            tokens = tuple(tokens)
+            if len(TextProcessor._line_tokens) >= TextProcessor.LINE_CACHE_SIZE:
+                TextProcessor._line_tokens.clear()
+            TextProcessor._line_tokens[key] = tokens
+        return tokens
+
 # ============================================================================
 # EXECUTION LOGGING
 # ============================================================================
@@ -672,6 +1007,15 @@ class ExecutionLogger:
     """Log all executed commands and scripts"""
     
     LOG_FILE = Config.CONFIG_DIR / "uses.log"
+    HEADER = (
+        "# Sigil Execution Log\n"
+        "# Format: TIMESTAMP | MODE | COMMAND/FILE | EXIT_CODE | WORKING_DIR | USER\n"
+        "# " + "=" * 80 + "\n"
+    )
+    # Entries not yet written, flushed every BATCH_SIZE entries
+    BATCH_SIZE = 256
+    _pending: List[str] = []
+    _user: Optional[str] = None
     
     @staticmethod
     def init_log_file() -> None:
@@ -679,46 +1023,64 @@ class ExecutionLogger:
         if not ExecutionLogger.LOG_FILE.exists():
             ExecutionLogger.LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
             with open(ExecutionLogger.LOG_FILE, "w", encoding="utf-8") as f:
-                f.write("# Sigil Execution Log\n")
-                f.write("# Format: TIMESTAMP | MODE | COMMAND/FILE | EXIT_CODE | WORKING_DIR | USER\n")
-                f.write("# " + "=" * 80 + "\n")
+                f.write(ExecutionLogger.HEADER)
     
     @staticmethod
     def log_execution(mode: str, command: str, exit_code: int = 0) -> None:
         """
         Log an execution to the uses.log file
-        
+
+        Entries are buffered and written in batches by flush(), which also runs
+        before the REPL prompt, when the log is read and at exit.
+
         Args:
             mode: "CMD" for command, "SCRIPT" for script file, "REPL" for interactive command
             command: The command or script path that was executed
             exit_code: Exit/return code of the execution
         """
         try:
-            ExecutionLogger.init_log_file()
-            
-            # Get current user
-            try:
-                user = getpass.getuser()
-            except Exception:
-                user = "unknown"
-            
+            # Get current user (once per session)
+            user = ExecutionLogger._user
+            if user is None:
+                try:
+                    user = getpass.getuser()
+                except Exception:
+                    user = "unknown"
+                ExecutionLogger._user = user
+
             # Sanitize command for logging (remove passwords, etc.)
             sanitized_cmd = ExecutionLogger._sanitize_command(command)
-            
+
             # Format timestamp
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            
+
             # Format log entry
-            log_entry = f"{timestamp} | {mode:6} | {sanitized_cmd:60} | {exit_code:3} | {State.current_dir} | {user}\n"
-            
-            # Write to log file
-            with open(ExecutionLogger.LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(log_entry)
-                
+            ExecutionLogger._pending.append(
+                f"{timestamp} | {mode:6} | {sanitized_cmd:60} | {exit_code:3} | {State.current_dir} | {user}\n"
+            )
+            if len(ExecutionLogger._pending) >= ExecutionLogger.BATCH_SIZE:
+                ExecutionLogger.flush()
+
         except Exception as e:
             # Don't crash if logging fails
             pass
-    
+
+    @staticmethod
+    def flush() -> None:
+        """Append buffered entries to the log file in one write"""
+        pending = ExecutionLogger._pending
+        if not pending:
+            return
+        try:
+            ExecutionLogger.init_log_file()
+            with open(ExecutionLogger.LOG_FILE, "a", encoding="utf-8") as f:
+                f.write("".join(pending))
+        except Exception:
+            # Don't crash if logging fails
+            pass
+        finally:
+            pending.clear()
+
     @staticmethod
     def _sanitize_command(command: str) -> str:
         """Sanitize command for logging (remove sensitive data)"""
@@ -747,20 +1109,41 @@ class ExecutionLogger:
 
 # Initialize the logger at module load
 ExecutionLogger.init_log_file()
+atexit.register(ExecutionLogger.flush)
 
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
 
+# Sentinel for single-probe dict lookups where None is a legitimate value
+_MISSING = object()
+
+@functools.lru_cache(maxsize=512)
+def _join_expanded(current_dir: str, expanded: str) -> Path:
+    """Join an already-expanded path string onto current_dir (memoized)"""
+    path = Path(expanded)
+
+    if not path.is_absolute():
+        path = Path(current_dir) / path
+
+    return path
+
+@functools.lru_cache(maxsize=256)
+def _expand_cached(version: int, text: str) -> str:
+    """Expand variables in text, memoized per State.variables version"""
+    return TextProcessor.expand_vars_in_string(text)
+
 def resolve_path(path_str: str) -> Path:
     """Resolve path with variable expansion and relative to CWD"""
+    # Expansion depends on live variables and HOME, and resolve() on symlinks that can
+    # change between calls, so only the lexical join is cached
     expanded = TextProcessor.expand_vars_in_string(path_str)
-    path = Path(expanded).expanduser()
+    if expanded.startswith("~"):
+        expanded = str(Path(expanded).expanduser())
+    return _join_expanded(str(State.current_dir), expanded).resolve()
 
-    if not path.is_absolute():
-        path = State.current_dir / path
-
-    return path.resolve()
+# Prefix of error lines written by report_error
+ERROR_PREFIX = "⚠ "
 
 def set_last_exit(code: int) -> None:
     """Set last exit code variables"""
@@ -769,10 +1152,16 @@ def set_last_exit(code: int) -> None:
     except (ValueError, TypeError):
         int_code = 1
 
+    State.last_exit = int_code
     State.variables['last'] = int_code
     State.variables['LAST'] = int_code
     State.variables['LAST_EXIT'] = int_code
 
+def report_error(message: str) -> None:
+    """Print message as a ⚠ error line and set the last exit code to 1"""
+    sys.stdout.write(ERROR_PREFIX + message + "\n")
+    set_last_exit(1)
+
 def parse_number(text: str) -> float | int:
     """Parse numeric value from string"""
     if text in State.variables:
@@ -791,6 +1180,248 @@ def parse_number(text: str) -> float | int:
     except (ValueError, TypeError):
         return 0
 
+@functools.lru_cache(maxsize=None)
+def enable_vt_mode() -> bool:
+    """Return True if the console understands ANSI escapes (enables VT mode on Windows)"""
+    if os.name != "nt":
+        return True
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except Exception:
+        return False
+
+# kernel32 and the console input handle for win_wait_key, looked up once; kernel32 stays
+# None where ctypes cannot reach it and win_wait_key falls back to polling
+_WIN_KERNEL32 = _WIN_STDIN = None
+if HAS_MSVCRT:
+    try:
+        import ctypes
+        _WIN_KERNEL32 = ctypes.windll.kernel32
+        _WIN_STDIN = _WIN_KERNEL32.GetStdHandle(-10)  # STD_INPUT_HANDLE
+    except Exception:
+        _WIN_KERNEL32 = None
+
+def win_wait_key(timeout_ms: int) -> Optional[bytes]:
+    """Read a console key within timeout_ms, blocking on the input handle instead of polling
+
+    Returns None on timeout or when msvcrt is unavailable.
+    """
+    if msvcrt is None:
+        return None
+    deadline = time.monotonic() + timeout_ms / 1000
+    # kbhit discards queued non-key events (key up, focus, mouse) that also signal the handle
+    while not msvcrt.kbhit():
+        remaining = int((deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            return None
+        if _WIN_KERNEL32 is None:
+            time.sleep(min(remaining, 10) / 1000)
+        elif _WIN_KERNEL32.WaitForSingleObject(_WIN_STDIN, remaining) != 0:  # not WAIT_OBJECT_0
+            return None
+    return msvcrt.getch()
+
+# ioctl request to share extents copy-on-write (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+def _clone_file(src: str, dst: str) -> bool:
+    """Copy-on-write clone src to dst where the filesystem supports it"""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except OSError:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+def kernel_copy_file(src: str, dst: str) -> None:
+    """Copy src to dst with metadata, keeping the bytes in the kernel where possible
+
+    The bytes go to a sibling temporary file that replaces dst once complete, so
+    a failed copy never leaves dst truncated.
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+    dst_dir, dst_name = os.path.split(dst)
+    fd, tmp_name = tempfile.mkstemp(dir=dst_dir or ".", prefix=f".{dst_name}.", suffix=".tmp")
+    try:
+        with open(src, "rb") as fsrc, os.fdopen(fd, "wb") as fdst:
+            copy_range = getattr(os, "copy_file_range", None)
+            try:
+                if copy_range is None:
+                    raise OSError("copy_file_range unavailable")
+                while copy_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+                    pass
+            except OSError:
+                # Unsupported here or across these filesystems; finish in user space
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst)
+        shutil.copystat(src, tmp_name)
+        os.replace(tmp_name, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+def link_tree(src: Path, dst: Path) -> None:
+    """Recreate directory tree src at dst without copying file bytes when possible
+
+    Each file is reflinked if the filesystem allows it, otherwise hardlinked,
+    and only byte-copied (shutil.copy2) as a last resort, e.g. across devices.
+    """
+    for root, dirs, files in os.walk(src, followlinks=True):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            src_file = os.path.join(root, name)
+            dst_file = os.path.join(target_root, name)
+            if _clone_file(src_file, dst_file):
+                continue
+            try:
+                os.link(src_file, dst_file)
+            except OSError:
+                shutil.copy2(src_file, dst_file)
+        shutil.copystat(root, target_root)
+
+def terminal_encoding() -> str:
+    """Encoding used for bytes written straight to stdout"""
+    return sys.stdout.encoding or "utf-8"
+
+def write_frame(data: bytes) -> None:
+    """Write a fully rendered, already encoded screen to the terminal in one call"""
+    sys.stdout.flush()
+    buffer = getattr(sys.stdout, "buffer", None)
+    if buffer is None:
+        sys.stdout.write(bytes(data).decode(terminal_encoding(), errors="replace"))
+        sys.stdout.flush()
+        return
+    if isinstance(getattr(buffer, "raw", None), io.FileIO):
+        # Plain file descriptor: write straight to it without the buffered writer's copy
+        fd = buffer.raw.fileno()
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        return
+    buffer.write(data)
+    buffer.flush()
+
+def display_width(text: str) -> int:
+    """Terminal columns taken by text: wide (CJK) characters take two, combining marks none"""
+    if text.isascii():
+        return len(text)
+    width = 0
+    for ch in text:
+        if unicodedata.combining(ch):
+            continue
+        width += 2 if unicodedata.east_asian_width(ch) in "WF" else 1
+    return width
+
+def format_size(size: int) -> str:
+    """Format a byte count for listings: exact below 1K, otherwise in K"""
+    if size < 1024:
+        return format(size, ",")
+    return format(size / 1024, ".1f") + "K"
+
+_INT_LITERAL_RE = re.compile(r'[+-]?\d+\Z')
+_FLOAT_LITERAL_RE = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\Z')
+
+@functools.lru_cache(maxsize=256)
+def coerce_literal(text: str) -> float | int | str:
+    """Convert a literal to int/float when it looks numeric, otherwise return it unchanged"""
+    is_float = "." in text or "e" in text.lower()
+    if is_float:
+        if _FLOAT_LITERAL_RE.match(text):
+            return float(text)
+    elif _INT_LITERAL_RE.match(text):
+        return int(text)
+
+    # int()/float() never accept a digit-free string on these paths
+    if not any(ch.isdigit() for ch in text):
+        return text
+
+    # Rare shapes the regexes don't cover (e.g. "1_000", surrounding spaces)
+    try:
+        return float(text) if is_float else int(text)
+    except (ValueError, TypeError):
+        return text
+
+# Parsed documents from `wrt json`, keyed by path -> (mtime_ns, size, data)
+_JSON_CACHE: Dict[str, Tuple[int, int, Any]] = {}
+
+def json_loads_bytes(raw: bytes) -> Any:
+    """Parse JSON from raw bytes, using orjson when available"""
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # stdlib also accepts NaN/Infinity and integers beyond 64 bits
+            pass
+    return json.loads(raw)
+
+def _orjson_matches_stdlib(data: Any) -> bool:
+    """Whether orjson would write data byte-for-byte like json.dumps(indent=2)
+
+    orjson writes non-ASCII text and DEL unescaped, NaN/Infinity as null and
+    exponents as 1e16 rather than 1e+16, so those documents go through json.
+    """
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            if not item.isascii() or "\x7f" in item:
+                return False
+        elif isinstance(item, float):
+            # repr switches to an exponent outside [1e-4, 1e16); NaN and inf fail too
+            if not (item == 0 or 1e-4 <= abs(item) < 1e16):
+                return False
+        elif isinstance(item, dict):
+            for key, value in item.items():
+                if not isinstance(key, str) or not key.isascii() or "\x7f" in key:
+                    return False
+                stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(item)
+    return True
+
+def json_dump_file(data: Any, path: Path) -> None:
+    """Write JSON with 2-space indent straight to path, using orjson when available"""
+    raw = None
+    if HAS_ORJSON and _orjson_matches_stdlib(data):
+        try:
+            raw = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except orjson.JSONEncodeError:
+            pass
+    with open(path, "wb") as f:
+        if raw is not None:
+            f.write(raw)
+            return
+        # Stream the stdlib encoder's chunks instead of building the whole document
+        with io.TextIOWrapper(f, encoding="utf-8") as text:
+            json.dump(data, text, indent=2)
+
+_QUOTED_RE = re.compile(r'(["\'])(.*)\1\Z', re.S)
+
+def strip_quotes(text: str) -> str:
+    """Remove one pair of matching surrounding double or single quotes"""
+    match = _QUOTED_RE.match(text)
+    return match.group(2) if match else text
+
 def parse_numbers(args: List[str]) -> List[float | int]:
     """Parse list of numbers"""
     return [parse_number(arg) for arg in args]
@@ -1755,10 +2386,7 @@ class ScriptCommands:
         script_file = args[0]
         
         # Remove quotes if present
-        if script_file.startswith('"') and script_file.endswith('"'):
-            script_file = script_file[1:-1]
-        elif script_file.startswith("'") and script_file.endswith("'"):
-            script_file = script_file[1:-1]
+        script_file = strip_quotes(script_file)
         
         # Expand variables in the script path
         script_file = TextProcessor.expand_vars_in_string(script_file)
@@ -1785,13 +2413,13 @@ class ScriptCommands:
         original_dir = State.current_dir
         original_script_file = State.script_file
         original_script_dir = State.script_dir
-        original_script_args = State.script_args[:]  # Copy list
+        original_script_args = State.script_args
         
         try:
             # Set new script context
             State.script_file = str(script_path)
             State.script_dir = str(script_path.parent)
-            State.script_args = args[1:] if len(args) > 1 else []
+            State.script_args = tuple(args[1:])
             
             # Change to script's directory
             State.current_dir = script_path.parent
@@ -1811,7 +2439,7 @@ class ScriptCommands:
             Interpreter.run_lines(lines, script_name=str(script_path))
             
             print("=" * 60)
-            exit_code = State.variables.get('last', 0)
+            exit_code = State.last_exit
             print(f"✓ New script completed. Exit code: {exit_code}")
             
             # Log completion
@@ -2462,10 +3090,285 @@ class ShellRunner:
             else:
                 ShellRunner.run_and_print([shell, '-c', cmd_str])
 
+# ============================================================================
+# EDITOR TEXT BUFFER
+# ============================================================================
+
+class LineCache:
+    """Sampled line-start offsets of a GapBuffer, so line lookups only scan locally
+
+    An anchor is kept every STRIDE lines plus a memo of the last lookup; finding
+    a line bisects to the nearest anchor and scans forward from there. Edits drop
+    the anchors after the edit offset, which are rebuilt lazily on the next scan.
+    """
+
+    STRIDE = 256
+
+    def __init__(self, buffer: "GapBuffer"):
+        self._buffer = buffer
+        self._offsets = [0]  # anchor line-start offsets, ascending
+        self._lines = [0]    # line numbers of those anchors (multiples of STRIDE)
+        self._last = (0, 0)  # (line, offset) of the last lookup
+
+    def invalidate(self, offset: int) -> None:
+        """Forget everything that may have moved because of an edit at offset"""
+        keep = bisect.bisect_right(self._offsets, offset)
+        del self._offsets[keep:]
+        del self._lines[keep:]
+        if self._last[1] > offset:
+            self._last = (0, 0)
+
+    def line_start(self, line: int) -> int:
+        """Logical offset where line begins (the end of the buffer past the last line)"""
+        index = bisect.bisect_right(self._lines, line) - 1
+        current, offset = self._lines[index], self._offsets[index]
+        last_line, last_offset = self._last
+        if current < last_line <= line:
+            current, offset = last_line, last_offset
+
+        buffer = self._buffer
+        stride = LineCache.STRIDE
+        while current < line:
+            newline = buffer.find(b"\n", offset)
+            if newline == -1:
+                return len(buffer)
+            offset = newline + 1
+            current += 1
+            if current % stride == 0 and current == self._lines[-1] + stride:
+                self._lines.append(current)
+                self._offsets.append(offset)
+        self._last = (line, offset)
+        return offset
+
+    def line_of(self, offset: int) -> int:
+        """Line number containing logical offset"""
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        return self._lines[index] + self._buffer.count(b"\n", self._offsets[index], offset)
+
+class GapBuffer:
+    """Editable byte buffer with a movable gap at the edit point
+
+    Inserting or deleting next to the gap only moves its boundaries, so typing
+    at the cursor is amortized O(1) instead of rebuilding the line it is on.
+    """
+
+    GAP_SIZE = 4096
+    READ_CHUNK = 1 << 20
+
+    def __init__(self, data: bytes = b""):
+        self._buf = bytearray(data)
+        self._gap_start = len(self._buf)
+        self._buf.extend(bytes(GapBuffer.GAP_SIZE))
+        self._gap_end = len(self._buf)
+        self._newlines = self._buf.count(b"\n", 0, self._gap_start)
+        self.lines = LineCache(self)
+
+    @classmethod
+    def from_file_data(cls, data: bytes) -> "GapBuffer":
+        """Buffer for file contents, with line endings normalized to \\n and no final newline"""
+        if b"\r" in data:
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        view = memoryview(data)
+        if data.endswith(b"\n"):
+            view = view[:-1]
+        return cls(view)
+
+    @classmethod
+    def from_file(cls, path) -> "GapBuffer":
+        """Buffer for a file, read in chunks straight into the buffer's own storage"""
+        with open(path, "rb", buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            buf = bytearray(size + cls.GAP_SIZE)
+            with memoryview(buf) as view:
+                filled = 0
+                while filled < size:
+                    count = f.readinto(view[filled:min(size, filled + cls.READ_CHUNK)])
+                    if not count:
+                        break
+                    filled += count
+            # Anything past the size we saw at open means the file grew meanwhile
+            extra = f.read()
+        if extra or buf.find(b"\r", 0, filled) != -1:
+            return cls.from_file_data(bytes(buf[:filled]) + extra)
+
+        # Adopt the storage as is; a final newline just becomes part of the gap
+        end = filled - 1 if filled and buf[filled - 1] == 0x0A else filled
+        buffer = cls()
+        buffer._buf = buf
+        buffer._gap_start, buffer._gap_end = end, len(buf)
+        buffer._newlines = buf.count(b"\n", 0, end)
+        return buffer
+
+    def __len__(self) -> int:
+        return len(self._buf) - (self._gap_end - self._gap_start)
+
+    def _move_gap(self, offset: int) -> None:
+        """Move the gap so it starts at logical offset"""
+        gap_start, gap_end = self._gap_start, self._gap_end
+        if offset == gap_start:
+            return
+        # Through a memoryview the move is one memmove, without a temporary copy of the span
+        with memoryview(self._buf) as view:
+            if offset < gap_start:
+                count = gap_start - offset
+                view[gap_end - count:gap_end] = view[offset:gap_start]
+                self._gap_start, self._gap_end = offset, gap_end - count
+            else:
+                count = offset - gap_start
+                view[gap_start:offset] = view[gap_end:gap_end + count]
+                self._gap_start, self._gap_end = offset, gap_end + count
+
+    def insert(self, offset: int, data: bytes) -> None:
+        """Insert data at logical offset"""
+        self.lines.invalidate(offset)
+        self._newlines += data.count(b"\n")
+        self._move_gap(offset)
+        size = len(data)
+        if size > self._gap_end - self._gap_start:
+            grow = max(GapBuffer.GAP_SIZE, size, len(self) // 2)
+            self._buf[self._gap_end:self._gap_end] = bytes(grow)
+            self._gap_end += grow
+        self._buf[self._gap_start:self._gap_start + size] = data
+        self._gap_start += size
+
+    def delete(self, offset: int, length: int) -> None:
+        """Delete length bytes starting at logical offset"""
+        self.lines.invalidate(offset)
+        self._move_gap(offset)
+        end = min(self._gap_end + length, len(self._buf))
+        self._newlines -= self._buf.count(b"\n", self._gap_end, end)
+        self._gap_end = end
+
+    def slice(self, start: int, end: int) -> bytes:
+        """Bytes between logical offsets start and end"""
+        gap_start, gap_end = self._gap_start, self._gap_end
+        gap = gap_end - gap_start
+        with memoryview(self._buf) as view:
+            if end <= gap_start:
+                return view[start:end].tobytes()
+            if start >= gap_start:
+                return view[start + gap:end + gap].tobytes()
+            return b"".join((view[start:gap_start], view[gap_end:end + gap]))
+
+    def byte_at(self, offset: int) -> int:
+        """Byte value at logical offset"""
+        if offset >= self._gap_start:
+            offset += self._gap_end - self._gap_start
+        return self._buf[offset]
+
+    def char_start(self, offset: int, floor: int = 0) -> int:
+        """Move offset back onto the first byte of its UTF-8 character, stopping at floor"""
+        while floor < offset < len(self) and self.byte_at(offset) & 0xC0 == 0x80:
+            offset -= 1
+        return offset
+
+    def char_end(self, offset: int, limit: int) -> int:
+        """Offset just past the UTF-8 character starting at offset, clamped to limit"""
+        offset += 1
+        while offset < limit and self.byte_at(offset) & 0xC0 == 0x80:
+            offset += 1
+        return min(offset, limit)
+
+    def getvalue(self) -> bytes:
+        """Whole contents without the gap"""
+        with memoryview(self._buf) as view:
+            return b"".join((view[:self._gap_start], view[self._gap_end:]))
+
+    def write_to(self, fd: int) -> None:
+        """Write the contents to a file descriptor straight from both sides of the gap"""
+        view = memoryview(self._buf)
+        parts = [part for part in (view[:self._gap_start], view[self._gap_end:]) if part]
+        # One gathered write usually takes everything; finish any short write part by part
+        written = os.writev(fd, parts) if hasattr(os, "writev") and parts else 0
+        for part in parts:
+            skip = min(written, len(part))
+            written -= skip
+            part = part[skip:]
+            while part:
+                part = part[os.write(fd, part):]
+
+    def find(self, sub: bytes, start: int = 0) -> int:
+        """Logical offset of the first sub at or after start, or -1"""
+        buf = self._buf
+        gap_start, gap_end = self._gap_start, self._gap_end
+        if start < gap_start:
+            index = buf.find(sub, start, gap_start)
+            if index != -1:
+                return index
+            if len(sub) > 1:
+                # A match may straddle the gap
+                low = max(start, gap_start - len(sub) + 1)
+                window = bytes(buf[low:gap_start]) + bytes(buf[gap_end:gap_end + len(sub) - 1])
+                index = window.find(sub)
+                if index != -1:
+                    return low + index
+            start = gap_start
+        index = buf.find(sub, start + gap_end - gap_start)
+        return index if index == -1 else index - (gap_end - gap_start)
+
+    def count(self, sub: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        """Occurrences of a single byte between logical offsets start and end"""
+        if end is None:
+            end = len(self)
+        gap_start, gap = self._gap_start, self._gap_end - self._gap_start
+        total = 0
+        if start < gap_start:
+            total += self._buf.count(sub, start, min(end, gap_start))
+        if end > gap_start:
+            total += self._buf.count(sub, max(start, gap_start) + gap, end + gap)
+        return total
+
+    def line_count(self) -> int:
+        """Number of lines; an empty buffer has one empty line"""
+        return self._newlines + 1
+
+    def line_start(self, line: int) -> int:
+        """Logical offset where line begins (the end of the buffer past the last line)"""
+        return self.lines.line_start(line)
+
+    def line_end(self, start: int) -> int:
+        """Offset of the newline ending the line that contains start, or the buffer end"""
+        index = self.find(b"\n", start)
+        return len(self) if index == -1 else index
+
 # ============================================================================
 # COMMAND IMPLEMENTATIONS
 # ============================================================================
 
+# Constant pieces of the ide and gp screens, built once
+_BAR_EQ80 = b"=" * 80
+_BAR_DASH80 = b"-" * 80
+_BAR_UND80 = b"_" * 80
+_BAR_DASH38 = "-" * 38
+_SPC38 = " " * 38
+_IDE_KEYS_LINE = b"Commands: Ctrl+S=Save, Ctrl+R=Run, Ctrl+Q=Quit, Ctrl+O=Open, Ctrl+F=Find"
+_ANSI_INV_ON = b"\033[7m"
+_ANSI_RESET = b"\033[0m"
+_ANSI_CURSOR_SPACE = _ANSI_INV_ON + b" " + _ANSI_RESET
+_ANSI_YELLOW = b"\033[93m"
+# Home, clear screen, clear scrollback
+_ANSI_CLEAR = b"\033[H\033[2J\033[3J"
+_ANSI_ERASE_LINE = b"\033[K"
+_ANSI_HIDE_CURSOR = b"\033[?25l"
+_ANSI_SHOW_CURSOR = b"\033[?25h"
+# Most bytes of typed-ahead or pasted text inserted per keystroke read
+_IDE_PASTE_LIMIT = 4096
+# Most terminal reads used to drain queued input before handling a key
+_IDE_READS_PER_KEY = 8
+# While keys keep arriving, redraw at most this often (seconds)
+_IDE_REDRAW_INTERVAL = 0.016
+# How long the rest of an escape sequence may lag behind its ESC (seconds), e.g. over SSH
+_IDE_ESC_WAIT = 0.05
+# Key bytes the ide reacts to
+_KEY_ESC = b"\x1b"
+_KEY_CSI = b"["
+_KEY_WIN_EXTENDED = b"\xe0"
+_KEY_WIN_PREFIXES = frozenset((b"\x00", _KEY_WIN_EXTENDED))
+_BACKSPACE = frozenset((b"\x7f", b"\x08"))
+_ENTER = frozenset((b"\r", b"\n"))
+# Bytes that end a run of typed text: C0 controls and DEL
+_CONTROL_BYTES = frozenset(bytes((code,)) for code in range(0x20)) | {b"\x7f"}
+
 class Commands:
     """All command implementations"""
 
@@ -2537,12 +3440,21 @@ class Commands:
         "fnlist": "fnlist  — List all defined functions",
         "fnrm": "fnrm <name>  — Remove a function",
     }
+    # Read-only view with interned keys so lookups by interned names compare by identity
+    HELP_TEXT = types.MappingProxyType({sys.intern(k): v for k, v in HELP_TEXT.items()})
+
+    # gp field label -> variable name: spaces become underscores, colons are dropped
+    _GP_VARNAME_TABLE = str.maketrans({" ": "_", ":": None})
+
+    # Bound str.format templates reused for every dirlook entry
+    _DIRLOOK_FILE_FMT = "  📄 {:40} {:>10}".format
+    _DIRLOOK_DIR_FMT = "  📂 {}/".format
 
     @staticmethod
     def help(args: List[str]) -> None:
         """Show help information"""
         if not args:
-            print("\n🔮 Sigil Commands (v1.0.1):\n")
+            out = ["\n🔮 Sigil Commands (v1.0.1):\n"]
             categories = {
                 "Files": ["mk", "cpy", "dlt", "move", "cd", "pwd", "dirlook", "opn", "opnlnk", "ex", "zip", "uzip"],
                 "Network": ["net"],
@@ -2562,19 +3474,21 @@ class Commands:
             }
 
             for category, cmds in categories.items():
-                print(f"  {category}:")
+                out.append(f"  {category}:")
                 for cmd in cmds:
                     if cmd in Commands.HELP_TEXT:
                         desc = Commands.HELP_TEXT[cmd].split('\n')[0].split('—')[-1].strip()
-                        print(f"    {cmd:12} — {desc}")
-                print()
-
-            print("Type: help <command> for details\n")
-            print("Comments: & # // single-line, /* */ block comments\n")
-            print(f"Version: {Config.VERSION}")
+                        out.append(f"    {cmd:12} — {desc}")
+                out.append("")
+
+            out.append("Type: help <command> for details\n")
+            out.append("Comments: & # // single-line, /* */ block comments\n")
+            out.append(f"Version: {Config.VERSION}")
+            # One write for the whole listing instead of a print per line
+            sys.stdout.write("\n".join(out) + "\n")
             return
 
-        cmd_name = args[0]
+        cmd_name = sys.intern(args[0])
         if cmd_name in Commands.HELP_TEXT:
             print(f"\n{Commands.HELP_TEXT[cmd_name]}\n")
         else:
@@ -2608,7 +3522,7 @@ class Commands:
         elif target_type == "file":
             path = resolve_path(args[1])
             content = " ".join(args[2:]) if len(args) > 2 else ""
-            existed = path.exists()
+            existed = os.path.exists(path)
             backup = None
 
             if existed:
@@ -2640,23 +3554,23 @@ class Commands:
         src = resolve_path(args[0])
         dst = resolve_path(args[1])
 
-        if not src.exists():
+        if not os.path.exists(src):
             print(f"⚠ Source does not exist: {src}")
             set_last_exit(1)
             return
 
-        dst_existed = dst.exists()
+        dst_existed = os.path.exists(dst)
         dst_backup = None
 
         if dst_existed:
-            if dst.is_dir():
+            if os.path.isdir(dst):
                 dst_backup = UndoManager.backup_path(dst)
             else:
                 dst_backup = UndoManager.backup_contents(dst)
 
         try:
-            if src.is_dir():
-                if dst.exists():
+            if os.path.isdir(src):
+                if os.path.exists(dst):
                     print(f"⚠ Destination already exists: {dst}")
                     set_last_exit(1)
                     return
@@ -2690,7 +3604,7 @@ class Commands:
 
         path = resolve_path(args[0])
 
-        if not path.exists():
+        if not os.path.exists(path):
             print(f"⚠ Path does not exist: {path}")
             set_last_exit(1)
             return
@@ -2717,16 +3631,16 @@ class Commands:
         src = resolve_path(args[1])
         dst = resolve_path(args[2])
 
-        if not src.exists():
+        if not os.path.exists(src):
             print(f"⚠ Source does not exist: {src}")
             set_last_exit(1)
             return
 
-        dst_existed = dst.exists()
+        dst_existed = os.path.exists(dst)
         dst_backup = None
 
         if dst_existed:
-            if dst.is_dir():
+            if os.path.isdir(dst):
                 dst_backup = UndoManager.backup_path(dst)
             else:
                 dst_backup = UndoManager.backup_contents(dst)
@@ -2760,7 +3674,7 @@ class Commands:
 
         path = resolve_path(args[0])
 
-        if path.is_dir():
+        if os.path.isdir(path):
             State.current_dir = path
             print(f"📁 {State.current_dir}")
             set_last_exit(0)
@@ -2777,18 +3691,20 @@ class Commands:
     @staticmethod
     def dirlook(args: List[str]) -> None:
         """List directory contents"""
-        print(f"\n📁 {State.current_dir}\n")
+        out = [f"\n📁 {State.current_dir}\n"]
         try:
             items = sorted(State.current_dir.iterdir())
+            file_fmt = Commands._DIRLOOK_FILE_FMT
+            dir_fmt = Commands._DIRLOOK_DIR_FMT
             for item in items:
                 if item.is_dir():
-                    print(f"  📂 {item.name}/")
+                    out.append(dir_fmt(item.name))
                 else:
-                    size = item.stat().st_size
-                    size_str = f"{size:,}" if size < 1024 else f"{size/1024:.1f}K"
-                    print(f"  📄 {item.name:40} {size_str:>10}")
+                    out.append(file_fmt(item.name, format_size(item.stat().st_size)))
+            sys.stdout.write("\n".join(out) + "\n")
             set_last_exit(0)
         except PermissionError:
+            sys.stdout.write(out[0] + "\n")
             print("⚠ Permission denied")
             set_last_exit(1)
 
@@ -2818,7 +3734,7 @@ class Commands:
 
         path = resolve_path(args[0])
 
-        if not path.exists():
+        if not os.path.exists(path):
             print(f"⚠ Path does not exist: {path}")
             set_last_exit(1)
             return
@@ -2908,6 +3824,7 @@ class Commands:
     @staticmethod
     def log(args: List[str]) -> None:
         """View or manage execution log"""
+        ExecutionLogger.flush()
         if not args or args[0] == "show":
             # Show recent log entries
             try:
@@ -2954,7 +3871,9 @@ class Commands:
             # Clear the log
             if confirm_destructive_action("clear the execution log"):
                 try:
-                    ExecutionLogger.init_log_file()
+                    # Truncate and rewrite the header in one open/write/close
+                    with open(ExecutionLogger.LOG_FILE, "w", encoding="utf-8") as f:
+                        f.write(ExecutionLogger.HEADER)
                     print("✓ Execution log cleared")
                     set_last_exit(0)
                 except Exception as e:
@@ -2986,23 +3905,21 @@ class Commands:
     @staticmethod
     def say(args: List[str]) -> None:
         """Print text with variable expansion"""
-        parts = []
-        for token in args:
-            if token.startswith("$") and token[1:] in State.variables:
-                parts.append(str(State.variables[token[1:]]))
-            elif token in State.variables:
-                parts.append(str(State.variables[token]))
-            else:
-                parts.append(token)
+        get = State.variables.get
+
+        def resolve(token: str) -> str:
+            # One probe per token: "$name" looks up "name", anything else looks up itself
+            value = get(token[1:] if token[:1] == "$" else token, _MISSING)
+            return token if value is _MISSING else str(value)
 
-        print(" ".join(parts))
+        print(" ".join(map(resolve, args)))
         set_last_exit(0)
 
     @staticmethod
-    def add(args: List[str]) -> None:
+    def add(args: List[str], _help: str = HELP_TEXT["add"]) -> None:
         """Add numbers"""
         if not args:
-            print(Commands.HELP_TEXT["add"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3018,10 +3935,10 @@ class Commands:
             set_last_exit(1)
 
     @staticmethod
-    def sub(args: List[str]) -> None:
+    def sub(args: List[str], _help: str = HELP_TEXT["sub"]) -> None:
         """Subtract numbers"""
         if len(args) < 2:
-            print(Commands.HELP_TEXT["sub"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3039,10 +3956,10 @@ class Commands:
             set_last_exit(1)
 
     @staticmethod
-    def mul(args: List[str]) -> None:
+    def mul(args: List[str], _help: str = HELP_TEXT["mul"]) -> None:
         """Multiply numbers"""
         if not args:
-            print(Commands.HELP_TEXT["mul"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3060,10 +3977,10 @@ class Commands:
             set_last_exit(1)
 
     @staticmethod
-    def div(args: List[str]) -> None:
+    def div(args: List[str], _help: str = HELP_TEXT["div"]) -> None:
         """Divide numbers"""
         if len(args) < 2:
-            print(Commands.HELP_TEXT["div"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3094,10 +4011,11 @@ class Commands:
                 set_last_exit(1)
                 return
 
-            print("\n📖 Aliases:\n")
+            out = ["\n📖 Aliases:\n"]
             for name, cmd in sorted(State.aliases.items()):
-                print(f"  {name:15} → {cmd}")
-            print()
+                out.append(f"  {name:15} → {cmd}")
+            out.append("")
+            sys.stdout.write("\n".join(out) + "\n")
             set_last_exit(0)
             return
 
@@ -3135,10 +4053,10 @@ class Commands:
             set_last_exit(1)
 
     @staticmethod
-    def let(args: List[str]) -> None:
+    def let(args: List[str], _help: str = HELP_TEXT["let"]) -> None:
         """Set variable"""
         if not args:
-            print(Commands.HELP_TEXT["let"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3149,7 +4067,7 @@ class Commands:
             args = args[1:]
 
         if not args:
-            print(Commands.HELP_TEXT["let"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3164,7 +4082,7 @@ class Commands:
             name = args[0]
             value = " ".join(args[1:])
         else:
-            print(Commands.HELP_TEXT["let"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3198,14 +4116,8 @@ class Commands:
                 final_value = TextProcessor.expand_vars_in_string(final_value)
             else:
                 expanded = TextProcessor.expand_vars_in_string(value)
-                # Try to parse as number
-                try:
-                    if "." in expanded or "e" in expanded.lower():
-                        final_value = float(expanded)
-                    else:
-                        final_value = int(expanded)
-                except (ValueError, TypeError):
-                    final_value = expanded
+                # Parse as number when possible (memoized, no exception on plain strings)
+                final_value = coerce_literal(expanded)
 
         # Set variable
         State.variables[name] = final_value
@@ -3229,7 +4141,7 @@ class Commands:
             set_last_exit(1)
             return
 
-        print("\n💾 Variables:\n")
+        out = ["\n💾 Variables:\n"]
         for name, value in sorted(State.variables.items()):
             flags = []
             if name in State.readonly_vars:
@@ -3238,8 +4150,9 @@ class Commands:
                 flags.append("exported")
 
             flag_str = f" ({', '.join(flags)})" if flags else ""
-            print(f"  {name:15} = {value}{flag_str}")
-        print()
+            out.append(f"  {name:15} = {value}{flag_str}")
+        out.append("")
+        sys.stdout.write("\n".join(out) + "\n")
         set_last_exit(0)
 
     @staticmethod
@@ -3348,10 +4261,7 @@ class Commands:
         if args:
             prompt = " ".join(args)
             # Handle quoted prompts
-            if prompt.startswith('"') and prompt.endswith('"'):
-                prompt = prompt[1:-1]
-            elif prompt.startswith("'") and prompt.endswith("'"):
-                prompt = prompt[1:-1]
+            prompt = strip_quotes(prompt)
         else:
             prompt = "Press any key to continue . . ."
         
@@ -3359,24 +4269,27 @@ class Commands:
         set_last_exit(0)
 
     @staticmethod
-    def exists(args: List[str]) -> None:
+    def exists(args: List[str], _help: str = HELP_TEXT["exists"]) -> None:
         """Check if path exists"""
         if not args:
-            print(Commands.HELP_TEXT["exists"])
+            print(_help)
             set_last_exit(1)
             return
 
-        path = resolve_path(args[0])
-        exists = path.exists()
+        try:
+            os.stat(resolve_path(args[0]))
+            exists = True
+        except (OSError, ValueError):
+            exists = False
 
         print("yes" if exists else "no")
         set_last_exit(0 if exists else 1)
 
     @staticmethod
-    def arg(args: List[str]) -> None:
+    def arg(args: List[str], _help: str = HELP_TEXT["arg"]) -> None:
         """Get script argument"""
         if not args:
-            print(Commands.HELP_TEXT["arg"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3402,12 +4315,13 @@ class Commands:
         if not args:
             # List profiles
             profiles = {"default"}
+            prefix_len = len(".sigilrc.")
             try:
-                for item in Config.CONFIG_DIR.iterdir():
-                    if item.name.startswith(".sigilrc."):
-                        name = item.name.replace(".sigilrc.", "")
-                        if not name.endswith(".bak"):
-                            profiles.add(name)
+                with os.scandir(Config.CONFIG_DIR) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if name.startswith(".sigilrc.") and not name.endswith(".bak"):
+                            profiles.add(name[prefix_len:])
             except Exception:
                 pass
 
@@ -3462,6 +4376,11 @@ class Commands:
 
         # Switch to profile
         name = subcommand
+        if name == State.current_profile:
+            print(f"✓ Already on profile: {name}")
+            set_last_exit(0)
+            return
+
         State.current_profile = name
         State.aliases.clear()
         State.variables.clear()
@@ -3473,7 +4392,7 @@ class Commands:
         if not path.exists():
             path.write_text(f"# Sigil Profile: {name}\n", encoding="utf-8")
 
-        RCManager.load()
+        RCManager.load_profile()
         print(f"✓ Switched to profile: {name}")
         set_last_exit(0)
 
@@ -3493,18 +4412,17 @@ class Commands:
             return
 
         try:
-            content = path.read_text(encoding="utf-8")
-            lines = content.splitlines()
+            lines = path.read_bytes().decode("utf-8").splitlines()
 
             # Save context
             prev_file = State.script_file
             prev_dir = State.script_dir
-            prev_args = State.script_args[:]
+            prev_args = State.script_args
 
             try:
                 State.script_file = str(path)
                 State.script_dir = str(path.parent)
-                State.script_args = args[1:] if len(args) > 1 else []
+                State.script_args = tuple(args[1:])
 
                 Interpreter.run_lines(lines)
             finally:
@@ -3517,10 +4435,10 @@ class Commands:
             set_last_exit(1)
 
     @staticmethod
-    def inc(args: List[str]) -> None:
+    def inc(args: List[str], _help: str = HELP_TEXT["inc"]) -> None:
         """Include script file"""
         if not args:
-            print(Commands.HELP_TEXT["inc"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3532,18 +4450,17 @@ class Commands:
             return
 
         try:
-            content = path.read_text(encoding="utf-8")
-            lines = content.splitlines()
+            lines = path.read_bytes().decode("utf-8").splitlines()
             Interpreter.run_lines(lines)
         except Exception as e:
             print(f"⚠ Include error: {e}")
             set_last_exit(1)
 
     @staticmethod
-    def wrt(args: List[str]) -> None:
+    def wrt(args: List[str], _help: str = HELP_TEXT["wrt"]) -> None:
         """Write to file"""
         if not args:
-            print(Commands.HELP_TEXT["wrt"])
+            print(_help)
             set_last_exit(1)
             return
 
@@ -3551,13 +4468,15 @@ class Commands:
 
         if mode == "line":
             if len(args) < 4:
-                print(Commands.HELP_TEXT["wrt"])
+                print(_help)
                 set_last_exit(1)
                 return
 
             try:
                 line_num = int(args[1])
             except (ValueError, TypeError):
+                line_num = 0
+            if line_num < 1:
                 print("⚠ Invalid line number")
                 set_last_exit(1)
                 return
@@ -3569,19 +4488,7 @@ class Commands:
             path = resolve_path(args[3])
 
             try:
-                lines = []
-                if path.exists():
-                    lines = path.read_text(encoding="utf-8").splitlines()
-
-                # Ensure enough lines
-                while len(lines) < line_num:
-                    lines.append("")
-
-                lines[line_num - 1] = text
-
-                path.parent.mkdir(parents=True, exist_ok=True)
-                path.write_text("\n".join(lines) + "\n", encoding="utf-8")
-
+                LineFileWriter.write_line(path, line_num, text)
                 print(f"✓ Wrote line {line_num} to {path}")
                 set_last_exit(0)
             except Exception as e:
@@ -3590,7 +4497,7 @@ class Commands:
 
         elif mode == "json":
             if len(args) < 4:
-                print(Commands.HELP_TEXT["wrt"])
+                print(_help)
                 set_last_exit(1)
                 return
 
@@ -3616,14 +4523,23 @@ class Commands:
                 except (ValueError, TypeError):
                     value = value_token
 
+            cache_key = str(file_path)
             try:
-                # Load existing JSON
+                # Load existing JSON, reusing the cached tree if the file is unchanged
                 data = {}
-                if file_path.exists():
-                    try:
-                        data = json.loads(file_path.read_text(encoding="utf-8"))
-                    except json.JSONDecodeError:
-                        data = {}
+                try:
+                    st = os.stat(file_path)
+                except FileNotFoundError:
+                    st = None
+                if st is not None:
+                    cached = _JSON_CACHE.get(cache_key)
+                    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                        data = cached[2]
+                    else:
+                        try:
+                            data = json_loads_bytes(file_path.read_bytes())
+                        except json.JSONDecodeError:
+                            data = {}
 
                 # Navigate to nested key
                 parts = key_path.split(".")
@@ -3638,17 +4554,110 @@ class Commands:
 
                 # Write JSON
                 file_path.parent.mkdir(parents=True, exist_ok=True)
-                file_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+                json_dump_file(data, file_path)
+                st = os.stat(file_path)
+                _JSON_CACHE[cache_key] = (st.st_mtime_ns, st.st_size, data)
 
                 print(f"✓ Wrote {key_path} = {value} to {file_path}")
                 set_last_exit(0)
             except Exception as e:
+                # The cached tree may have been mutated without reaching disk
+                _JSON_CACHE.pop(cache_key, None)
                 print(f"⚠ JSON write failed: {e}")
                 set_last_exit(1)
         else:
             print(f"⚠ Unknown mode: {mode}")
             set_last_exit(1)
 
+    @staticmethod
+    def _remove_path(path: Path) -> None:
+        """Remove a file or directory tree if it exists"""
+        if path.exists():
+            if path.is_dir():
+                shutil.rmtree(str(path))
+            else:
+                path.unlink()
+
+    @staticmethod
+    def _undo_mk_file(action: dict) -> None:
+        path = Path(action["path"])
+        existed = action.get("existed", False)
+        backup = action.get("backup")
+        if existed and backup:
+            # restore previous contents
+            shutil.copy2(backup, str(path))
+        else:
+            Commands._remove_path(path)
+
+    @staticmethod
+    def _undo_mk_dir(action: dict) -> None:
+        path = Path(action["path"])
+        if path.exists() and path.is_dir():
+            shutil.rmtree(str(path))
+
+    @staticmethod
+    def _undo_dlt(action: dict) -> None:
+        backup = action.get("backup")
+        if backup:
+            # move back
+            UndoManager.safe_move(Path(backup), Path(action["path"]))
+
+    @staticmethod
+    def _undo_cpy(action: dict) -> None:
+        # best-effort restore
+        dst = Path(action.get("dst", ""))
+        dst_backup = action.get("dst_backup")
+        Commands._remove_path(dst)
+        if dst_backup:
+            UndoManager.safe_move(Path(dst_backup), dst)
+
+    @staticmethod
+    def _undo_move(action: dict) -> None:
+        # best-effort restore: move back, then put any overwritten destination back
+        dst = Path(action.get("dst", ""))
+        src = Path(action.get("src", ""))
+        dst_backup = action.get("dst_backup")
+        if dst.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            UndoManager.fast_move(dst, src)
+        if dst_backup:
+            UndoManager.safe_move(Path(dst_backup), dst)
+
+    @staticmethod
+    def _redo_mk_file(action: dict) -> None:
+        path = Path(action["path"])
+        # we can't perfectly redo content without stored content; best-effort create empty
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists():
+            path.write_text("", encoding="utf-8")
+
+    @staticmethod
+    def _redo_mk_dir(action: dict) -> None:
+        Path(action["path"]).mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _redo_dlt(action: dict) -> None:
+        Commands._remove_path(Path(action["path"]))
+
+    @staticmethod
+    def _redo_cpy(action: dict) -> None:
+        src = Path(action["src"])
+        dst = Path(action["dst"])
+        if src.exists():
+            if src.is_dir():
+                shutil.copytree(str(src), str(dst))
+            else:
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(str(src), str(dst))
+
+    @staticmethod
+    def _redo_move(action: dict) -> None:
+        src = Path(action["src"])
+        dst = Path(action["dst"])
+        if src.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            UndoManager.fast_move(src, dst)
+
     @staticmethod
     def undo(args: List[str]) -> None:
         """Undo last file operation"""
@@ -3661,54 +4670,14 @@ class Commands:
         State.redo_stack.append(action)
 
         op = action.get("op")
-        try:
-            if op == "mk_file":
-                path = Path(action["path"])
-                existed = action.get("existed", False)
-                backup = action.get("backup")
-                if existed and backup:
-                    # restore previous contents
-                    shutil.copy2(backup, str(path))
-                else:
-                    if path.exists():
-                        if path.is_dir():
-                            shutil.rmtree(str(path))
-                        else:
-                            path.unlink()
-            elif op == "mk_dir":
-                path = Path(action["path"])
-                if path.exists() and path.is_dir():
-                    shutil.rmtree(str(path))
-            elif op == "dlt":
-                backup = action.get("backup")
-                if backup:
-                    # move back
-                    UndoManager.safe_move(Path(backup), Path(action["path"]))
-            elif op in ("cpy", "move"):
-                # best-effort restore
-                dst = Path(action.get("dst", ""))
-                src = Path(action.get("src", ""))
-                dst_backup = action.get("dst_backup")
-                if op == "cpy":
-                    if dst.exists():
-                        if dst.is_dir():
-                            shutil.rmtree(str(dst))
-                        else:
-                            dst.unlink()
-                    if dst_backup:
-                        UndoManager.safe_move(Path(dst_backup), dst)
-                elif op == "move":
-                    # move back
-                    if dst.exists():
-                        dst.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.move(str(dst), str(src))
-                    if dst_backup:
-                        UndoManager.safe_move(Path(dst_backup), dst)
-            else:
-                print(f"⚠ Unsupported undo operation: {op}")
-                set_last_exit(1)
-                return
+        handler = UNDO_HANDLERS.get(op)
+        if handler is None:
+            print(f"⚠ Unsupported undo operation: {op}")
+            set_last_exit(1)
+            return
 
+        try:
+            handler(action)
             print("✓ Undone")
             set_last_exit(0)
         except Exception as e:
@@ -3727,44 +4696,14 @@ class Commands:
         State.undo_stack.append(action)
 
         op = action.get("op")
-        try:
-            if op == "mk_file":
-                path = Path(action["path"])
-                existed = action.get("existed", False)
-                # we can't perfectly redo content without stored content; best-effort create empty
-                path.parent.mkdir(parents=True, exist_ok=True)
-                if not path.exists():
-                    path.write_text("", encoding="utf-8")
-            elif op == "mk_dir":
-                path = Path(action["path"])
-                path.mkdir(parents=True, exist_ok=True)
-            elif op == "dlt":
-                path = Path(action["path"])
-                if path.exists():
-                    if path.is_dir():
-                        shutil.rmtree(str(path))
-                    else:
-                        path.unlink()
-            elif op == "cpy":
-                src = Path(action["src"])
-                dst = Path(action["dst"])
-                if src.exists():
-                    if src.is_dir():
-                        shutil.copytree(str(src), str(dst))
-                    else:
-                        dst.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copy2(str(src), str(dst))
-            elif op == "move":
-                src = Path(action["src"])
-                dst = Path(action["dst"])
-                if src.exists():
-                    dst.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.move(str(src), str(dst))
-            else:
-                print(f"⚠ Unsupported redo operation: {op}")
-                set_last_exit(1)
-                return
+        handler = REDO_HANDLERS.get(op)
+        if handler is None:
+            print(f"⚠ Unsupported redo operation: {op}")
+            set_last_exit(1)
+            return
 
+        try:
+            handler(action)
             print("✓ Redone")
             set_last_exit(0)
         except Exception as e:
@@ -3792,9 +4731,9 @@ class Commands:
                     print("⚠ Plugin already installed")
                     set_last_exit(1)
                     return
-                shutil.copytree(str(src), str(dst))
+                link_tree(src, dst)
             else:
-                shutil.copy2(str(src), str(dst))
+                kernel_copy_file(str(src), str(dst))
             State.plugin_registry[src.name] = str(dst)
             print(f"✓ Plugin installed: {src.name}")
             set_last_exit(0)
@@ -3844,48 +4783,33 @@ class Commands:
         field2_label = args[2]
         
         # Remove quotes if present
-        if message.startswith('"') and message.endswith('"'):
-            message = message[1:-1]
-        elif message.startswith("'") and message.endswith("'"):
-            message = message[1:-1]
-        
-        if field1_label.startswith('"') and field1_label.endswith('"'):
-            field1_label = field1_label[1:-1]
-        elif field1_label.startswith("'") and field1_label.endswith("'"):
-            field1_label = field1_label[1:-1]
-        
-        if field2_label.startswith('"') and field2_label.endswith('"'):
-            field2_label = field2_label[1:-1]
-        elif field2_label.startswith("'") and field2_label.endswith("'"):
-            field2_label = field2_label[1:-1]
-        
-        # Expand variables in the text
-        message = TextProcessor.expand_vars_in_string(message)
-        field1_label = TextProcessor.expand_vars_in_string(field1_label)
-        field2_label = TextProcessor.expand_vars_in_string(field2_label)
+        message = strip_quotes(message)
+        
+        field1_label = strip_quotes(field1_label)
+        
+        field2_label = strip_quotes(field2_label)
+        
+        # Expand variables in all three texts with a single pass
+        texts = (message, field1_label, field2_label)
+        version = State.variables.version
+        expanded = _expand_cached(version, "\x1f".join(texts)).split("\x1f")
+        if len(expanded) != 3:
+            # A value or an unterminated ${ swallowed/added a separator; expand separately
+            expanded = [_expand_cached(version, t) for t in texts]
+        message, field1_label, field2_label = expanded
         
         # Create the formatted box
         print()
-        print("+" + "-" * 38 + "+")
+        print("+" + _BAR_DASH38 + "+")
         
         # Message line (centered)
         if message:
-            print("|" + " " * 38 + "|")
+            print("|" + _SPC38 + "|")
             message_padding = 38 - len(message) - 2
             if message_padding < 0:
-                # Message is too long, split it
-                words = message.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    if len(current_line) + len(word) + 1 <= 36:
-                        current_line += (" " if current_line else "") + word
-                    else:
-                        lines.append(current_line)
-                        current_line = word
-                if current_line:
-                    lines.append(current_line)
+                # Message is too long, wrap it on word boundaries
+                lines = textwrap.wrap(" ".join(message.split()), width=36,
+                                      break_long_words=False, break_on_hyphens=False)
                 
                 for line in lines:
                     padding = 38 - len(line) - 2
@@ -3898,21 +4822,21 @@ class Commands:
                 print("|" + " " * left_pad + message + " " * right_pad + "|")
         
         # Separator line
-        print("|" + " " * 38 + "|")
-        print("|" + "-" * 38 + "|")
+        print("|" + _SPC38 + "|")
+        print("|" + _BAR_DASH38 + "|")
         
         # First field
-        print("|" + " " * 38 + "|")
+        print("|" + _SPC38 + "|")
         field1_display = f"| {field1_label}:"
         print(field1_display + " " * (38 - len(field1_display)) + "|")
         
         # Second field
-        print("|" + " " * 38 + "|")
+        print("|" + _SPC38 + "|")
         field2_display = f"| {field2_label}:"
         print(field2_display + " " * (38 - len(field2_display)) + "|")
         
-        print("|" + " " * 38 + "|")
-        print("+" + "-" * 38 + "+")
+        print("|" + _SPC38 + "|")
+        print("+" + _BAR_DASH38 + "+")
         print()
         
         # Get user input for both fields
@@ -3925,11 +4849,10 @@ class Commands:
             return
         
         # Store in variables (using field labels as variable names, sanitized)
-        var1_name = field1_label.lower().replace(" ", "_").replace(":", "")
-        var2_name = field2_label.lower().replace(" ", "_").replace(":", "")
+        var1_name = field1_label.lower().translate(Commands._GP_VARNAME_TABLE)
+        var2_name = field2_label.lower().translate(Commands._GP_VARNAME_TABLE)
         
-        State.variables[var1_name] = field1_input
-        State.variables[var2_name] = field2_input
+        State.variables.update({var1_name: field1_input, var2_name: field2_input})
         
         print(f"✓ Saved: {var1_name} = '{field1_input}', {var2_name} = '{field2_input}'")
         set_last_exit(0)
@@ -3940,10 +4863,7 @@ class Commands:
         # Default filename or use provided argument
         if args:
             filename = args[0]
-            if filename.startswith('"') and filename.endswith('"'):
-                filename = filename[1:-1]
-            elif filename.startswith("'") and filename.endswith("'"):
-                filename = filename[1:-1]
+            filename = strip_quotes(filename)
         else:
             # Prompt for filename
             try:
@@ -3964,46 +4884,86 @@ class Commands:
         filepath = resolve_path(filename)
         
         # Load existing content if file exists
-        content_lines = []
+        doc = GapBuffer()
         if filepath.exists():
             try:
-                content = filepath.read_text(encoding='utf-8')
-                content_lines = content.splitlines()
+                doc = GapBuffer.from_file(filepath)
                 print(f"📄 Loaded existing file: {filepath}")
             except Exception as e:
                 print(f"⚠ Error loading file: {e}")
-                content_lines = []
+                doc = GapBuffer()
         else:
             print(f"📝 Creating new file: {filepath}")
         
-        # Editor state
+        # Editor state; the text lives in one gap buffer of UTF-8 bytes and is only decoded when drawn
         cursor_pos = 0  # Line number (0-indexed)
-        cursor_col = 0  # Column position
+        cursor_col = 0  # Byte offset into the current line
         editing = True
         modified = False
         scroll_offset = 0
         status_msg = ""
         status_msg_time = 0
+        # Terminal size is read once here and refreshed on SIGWINCH, not per redraw
+        term_size = shutil.get_terminal_size((80, 24))
+        
+        def on_resize(signum, frame):
+            """Refresh the cached terminal size when the window changes"""
+            nonlocal term_size, last_frame
+            term_size = shutil.get_terminal_size((80, 24))
+            last_frame = None
+        
+        vt_enabled = enable_vt_mode()
+        # Rows as last drawn, for repainting only what changed; None forces a full repaint
+        last_frame = None
+        # Output buffer reused by every frame
+        frame_buf = bytearray()
+        # Encoded rows (and their widths) of lines drawn without the cursor, by line number;
+        # edits drop the lines they touch
+        row_cache = {}
+        # Match offsets of recent Ctrl+F terms; any edit clears it
+        search_hits = {}
+        
+        # Bytes already read from the keyboard but not yet handled
+        pending = bytearray()
+        text_decoder = codecs.getincrementaldecoder("utf-8")("ignore" if HAS_MSVCRT else "replace")
+        text_stops = _CONTROL_BYTES | _KEY_WIN_PREFIXES if HAS_MSVCRT else _CONTROL_BYTES
+        
+        # Unix terminal settings, read once; the editor switches to raw mode for the whole
+        # session and only goes back to cooked mode around line-based prompts
+        term_fd = None
+        cooked_settings = raw_settings = None
+        if HAS_UNIX_TERM and not HAS_MSVCRT:
+            try:
+                term_fd = sys.stdin.fileno()
+                cooked_settings = termios.tcgetattr(term_fd)
+            except (OSError, ValueError, termios.error):
+                term_fd = None
         
         def clear_screen():
-            """Clear terminal screen"""
+            """Clear terminal screen (fallback for consoles without ANSI support)"""
             os.system('cls' if os.name == 'nt' else 'clear')
         
         def display_editor():
             """Display editor interface"""
-            nonlocal scroll_offset, status_msg, status_msg_time
+            nonlocal scroll_offset, status_msg, status_msg_time, last_frame
+            
+            # With ANSI support the clear is part of the frame write; no process spawn
+            if not vt_enabled:
+                clear_screen()
             
-            clear_screen()
+            enc = terminal_encoding()
             
             # Editor header
-            print(f"Sigil IDE - {filepath.name} {'[MODIFIED]' if modified else ''}")
-            print("=" * 80)
-            print("Commands: Ctrl+S=Save, Ctrl+R=Run, Ctrl+Q=Quit, Ctrl+O=Open, Ctrl+F=Find")
-            print("-" * 80)
+            header = f"Sigil IDE - {filepath.name} {'[MODIFIED]' if modified else ''}"
+            rows = [
+                header.encode(enc, "replace"),
+                _BAR_EQ80,
+                _IDE_KEYS_LINE,
+                _BAR_DASH80,
+            ]
             
             # Calculate visible lines (terminal height minus status area)
-            term_height = 24  # Default
-            visible_lines = term_height - 8
+            visible_lines = max(1, term_size.lines - 8)
             
             # Adjust scroll offset if cursor is outside visible area
             if cursor_pos < scroll_offset:
@@ -4012,53 +4972,295 @@ class Commands:
                 scroll_offset = cursor_pos - visible_lines + 1
             
             # Display lines
+            line_total = doc.line_count()
             start_line = scroll_offset
-            end_line = min(start_line + visible_lines, len(content_lines))
+            end_line = min(start_line + visible_lines, line_total)
+            # Rows that wrap shift everything below them, which defeats row-addressed repaints;
+            # start from the fixed rows, the 80-column bars and the header
+            widest = max(len(_BAR_EQ80), display_width(header), display_width(status_msg))
+            if len(row_cache) > 4 * visible_lines:
+                row_cache.clear()
+            cursor_char = 0  # Character column of the cursor, shared with the position row
             
             for i in range(start_line, end_line):
-                line_num = i + 1
-                line_prefix = f"{line_num:4d} | "
+                if i != cursor_pos and i in row_cache:
+                    # Unchanged since it was last drawn; no slice, decode or encode
+                    row, width = row_cache[i]
+                    rows.append(row)
+                    widest = max(widest, width)
+                    continue
                 
-                # Show cursor on current line
-                if i == cursor_pos:
-                    # Build line with cursor marker
-                    line_content = content_lines[i] if i < len(content_lines) else ""
-                    
-                    # Handle empty line
-                    if not line_content:
-                        print(f"> {line_prefix} \033[7m \033[0m")  # Inverted space for cursor
-                    else:
-                        # Truncate long lines
-                        display_line = line_content[:76]
-                        if cursor_col >= len(line_content):
-                            # Cursor at end
-                            print(f"> {line_prefix}{display_line}\033[7m \033[0m")
-                        else:
-                            # Cursor in middle
-                            before_cursor = display_line[:cursor_col]
-                            at_cursor = display_line[cursor_col] if cursor_col < len(display_line) else " "
-                            after_cursor = display_line[cursor_col + 1:] if cursor_col + 1 < len(display_line) else ""
-                            print(f"> {line_prefix}{before_cursor}\033[7m{at_cursor}\033[0m{after_cursor}")
+                offset = doc.line_start(i)
+                raw_line = doc.slice(offset, doc.line_end(offset))
+                line_content = raw_line.decode("utf-8", "surrogateescape")
+                display_line = line_content[:76]  # Truncate for display
+                width = display_width(display_line) + 10
+                widest = max(widest, width)
+                
+                if i != cursor_pos:
+                    row = b"  %4d | " % (i + 1) + display_line.encode(enc, "replace")
+                    row_cache[i] = (row, width)
+                    rows.append(row)
+                    continue
+                
+                cursor_char = len(raw_line[:cursor_col].decode("utf-8", "surrogateescape"))
+                if not line_content:
+                    # Inverted space for cursor on an empty line
+                    row = b"> %4d |  " % (i + 1) + _ANSI_CURSOR_SPACE
+                elif cursor_col >= len(raw_line):
+                    # Cursor at end
+                    row = b"> %4d | " % (i + 1) + display_line.encode(enc, "replace") + _ANSI_CURSOR_SPACE
                 else:
-                    # Normal line display
-                    line_content = content_lines[i] if i < len(content_lines) else ""
-                    display_line = line_content[:76]  # Truncate for display
-                    print(f"  {line_prefix}{display_line}")
+                    # Cursor in middle; slice as text so multi-byte characters stay whole
+                    row = b"".join((
+                        b"> %4d | " % (i + 1),
+                        display_line[:cursor_char].encode(enc, "replace"),
+                        _ANSI_INV_ON,
+                        (display_line[cursor_char:cursor_char + 1] or " ").encode(enc, "replace"),
+                        _ANSI_RESET,
+                        display_line[cursor_char + 1:].encode(enc, "replace"),
+                    ))
+                rows.append(row)
             
             # Fill remaining lines with tildes
-            for _ in range(end_line - start_line, visible_lines):
-                print("~")
-            
-            print("-" * 80)
+            rows.extend([b"~"] * (visible_lines - (end_line - start_line)))
+            rows.append(_BAR_DASH80)
             
             # Status line
             if status_msg and time.time() - status_msg_time < 3:
-                print(f"\033[93m{status_msg}\033[0m")  # Yellow
+                rows.append(_ANSI_YELLOW + status_msg.encode(enc, "replace") + _ANSI_RESET)
             else:
                 status_msg = ""
             
-            print(f"Line {cursor_pos + 1}/{len(content_lines)}, Col {cursor_col + 1} | Modified: {modified}")
-            print("_" * 80)
+            position = f"Line {cursor_pos + 1}/{line_total}, Col {cursor_char + 1} | Modified: {modified}"
+            widest = max(widest, len(position))
+            rows.append(position.encode(enc, "replace"))
+            rows.append(_BAR_UND80)
+            
+            # Repaint only the rows that changed since the last frame. A frame as tall as
+            # the terminal scrolls it by its final newline, so that case always repaints.
+            out = frame_buf
+            out.clear()
+            if (vt_enabled and last_frame is not None and len(last_frame) == len(rows) < term_size.lines
+                    and widest <= term_size.columns):
+                out += _ANSI_HIDE_CURSOR
+                for number, (row, old) in enumerate(zip(rows, last_frame), 1):
+                    if row != old:
+                        out += b"\033[%d;1H" % number
+                        out += _ANSI_ERASE_LINE
+                        out += row
+                out += b"\033[%d;1H" % (len(rows) + 1)
+                out += _ANSI_SHOW_CURSOR
+            else:
+                if vt_enabled:
+                    out += _ANSI_CLEAR
+                out += b"\n".join(rows)
+                out += b"\n"
+            last_frame = rows
+            write_frame(out)
+        
+        def current_line() -> Tuple[int, int]:
+            """Start and end offsets of the cursor's line; the buffer always has at least one line"""
+            start = doc.line_start(cursor_pos)
+            return start, doc.line_end(start)
+        
+        def clamp_col(col: int) -> int:
+            """Fit a byte column onto a character boundary of the current line"""
+            start, end = current_line()
+            return doc.char_start(start + max(0, min(col, end - start)), start) - start
+        
+        def move_to_line(new_pos: int):
+            """Move the cursor to another line, keeping its character column where it fits"""
+            nonlocal cursor_pos, cursor_col
+            start = doc.line_start(cursor_pos)
+            char_col = len(doc.slice(start, start + cursor_col).decode("utf-8", "surrogateescape"))
+            cursor_pos = new_pos
+            line = doc.slice(*current_line()).decode("utf-8", "surrogateescape")
+            cursor_col = len(line[:char_col].encode("utf-8", "surrogateescape"))
+        
+        def move_right():
+            """Step the cursor over the character under it"""
+            nonlocal cursor_col
+            start, end = current_line()
+            cursor_col = doc.char_end(start + cursor_col, end) - start
+        
+        def insert_text(data: bytes):
+            """Insert bytes at the cursor; the gap is already there, so no line is rebuilt"""
+            nonlocal cursor_col, modified
+            doc.insert(doc.line_start(cursor_pos) + cursor_col, data)
+            row_cache.pop(cursor_pos, None)
+            search_hits.clear()
+            cursor_col += len(data)
+            modified = True
+        
+        def insert_newline():
+            """Split the current line at the cursor"""
+            nonlocal cursor_pos, cursor_col, modified
+            doc.insert(doc.line_start(cursor_pos) + cursor_col, b"\n")
+            # Every line below moves down one
+            row_cache.clear()
+            search_hits.clear()
+            cursor_pos += 1
+            cursor_col = 0
+            modified = True
+        
+        def delete_back():
+            """Delete the character before the cursor, joining lines at column 0"""
+            nonlocal cursor_pos, cursor_col, modified
+            line_start = doc.line_start(cursor_pos)
+            if cursor_col > 0:
+                start = doc.char_start(line_start + cursor_col - 1, line_start) - line_start
+                doc.delete(line_start + start, cursor_col - start)
+                row_cache.pop(cursor_pos, None)
+                search_hits.clear()
+                cursor_col = start
+                modified = True
+            elif cursor_pos > 0:
+                # Remove the newline that ends the previous line
+                cursor_col = line_start - 1 - doc.line_start(cursor_pos - 1)
+                doc.delete(line_start - 1, 1)
+                row_cache.clear()
+                search_hits.clear()
+                cursor_pos -= 1
+                modified = True
+        
+        def find_next(search_term: str):
+            """Move the cursor to the next line after it containing search_term"""
+            nonlocal cursor_pos, cursor_col
+            hits = search_hits.get(search_term)
+            if hits is None:
+                # One scan over the whole buffer, kept until the next edit so repeats only bisect
+                needle = search_term.encode('utf-8')
+                hits = []
+                found = doc.find(needle)
+                while found != -1:
+                    hits.append(found)
+                    found = doc.find(needle, found + len(needle))
+                if len(search_hits) >= 16:
+                    search_hits.clear()
+                search_hits[search_term] = hits
+            # The term has no newline, so a hit never spans lines
+            index = bisect.bisect_left(hits, doc.line_start(cursor_pos + 1))
+            if index == len(hits):
+                set_status(f"✗ '{search_term}' not found")
+                return
+            found = hits[index]
+            cursor_pos = doc.lines.line_of(found)
+            cursor_col = found - doc.line_start(cursor_pos)
+        
+        def open_file(new_file: str):
+            """Replace the buffer with another file's contents"""
+            nonlocal doc, filepath, cursor_pos, cursor_col, scroll_offset, modified
+            filepath = resolve_path(new_file)
+            if filepath.exists():
+                doc = GapBuffer.from_file(filepath)
+                row_cache.clear()
+                search_hits.clear()
+                cursor_pos = 0
+                cursor_col = 0
+                scroll_offset = 0
+                modified = False
+                set_status(f"✓ Opened {filepath.name}")
+            else:
+                set_status(f"✗ File not found: {new_file}")
+        
+        def key_waiting(timeout: float = 0) -> bool:
+            """Whether another key can be read, waiting up to timeout seconds for one"""
+            if pending:
+                return True
+            if HAS_MSVCRT:
+                return msvcrt.kbhit()
+            return bool(select.select([term_fd], [], [], timeout)[0])
+        
+        def fill_pending():
+            """Block for input, then drain whatever else the terminal has queued"""
+            pending.extend(os.read(term_fd, _IDE_PASTE_LIMIT))
+            for _ in range(_IDE_READS_PER_KEY - 1):
+                if not select.select([term_fd], [], [], 0)[0]:
+                    break
+                pending.extend(os.read(term_fd, _IDE_PASTE_LIMIT))
+        
+        def cooked(func, *args):
+            """Call func (a line-based prompt) with the terminal back in cooked mode"""
+            if raw_settings is None:
+                return func(*args)
+            termios.tcsetattr(term_fd, termios.TCSADRAIN, cooked_settings)
+            try:
+                return func(*args)
+            finally:
+                termios.tcsetattr(term_fd, termios.TCSADRAIN, raw_settings)
+        
+        def read_byte() -> bytes:
+            """Next keyboard byte, refilling from the terminal in as few reads as possible"""
+            if not pending:
+                if HAS_MSVCRT:
+                    return msvcrt.getch()
+                fill_pending()
+            ch = bytes(pending[:1])
+            del pending[:1]
+            return ch
+        
+        def read_csi() -> bytes:
+            """Rest of a CSI sequence after ESC (e.g. b'[A'), or b'' for a lone Escape"""
+            # A sequence split across reads arrives shortly after its ESC; only a
+            # quiet terminal means the Escape key itself
+            if not key_waiting(_IDE_ESC_WAIT):
+                return b""
+            if not pending:
+                fill_pending()
+            if pending[:1] != _KEY_CSI:
+                return b""
+            seq = bytearray(read_byte())
+            # Parameters run until a final byte in 0x40-0x7E
+            while key_waiting(_IDE_ESC_WAIT):
+                ch = read_byte()
+                seq += ch
+                if 0x40 <= ch[0] <= 0x7E:
+                    break
+            return bytes(seq)
+        
+        def read_text_run(first: bytes) -> str:
+            """Collect printable input queued after first (a paste), stopping before control keys"""
+            run = bytearray(first)
+            while len(run) < _IDE_PASTE_LIMIT and key_waiting():
+                ch = read_byte()
+                if ch in text_stops:
+                    # Leave it for the next handle_input call
+                    pending[0:0] = ch
+                    break
+                run += ch
+            return text_decoder.decode(bytes(run))
+        
+        def raw_prompt(label: str) -> str:
+            """Read one line without leaving raw mode, echoing it here; Escape or Ctrl+C cancels"""
+            write_frame(label.encode(terminal_encoding(), "replace"))
+            line = bytearray()
+            echo = bytearray()
+            while True:
+                # Echo a pasted or typed-ahead run in one write
+                if echo and not key_waiting():
+                    write_frame(echo)
+                    echo.clear()
+                ch = read_byte()
+                if ch in _ENTER:
+                    break
+                if ch in _BACKSPACE:
+                    if line:
+                        start = len(line) - 1
+                        while start > 0 and line[start] & 0xC0 == 0x80:
+                            start -= 1
+                        del line[start:]
+                        echo += b"\b \b"
+                elif ch == b"\x03" or (ch == _KEY_ESC and (HAS_MSVCRT or not read_csi())):
+                    line.clear()
+                    break
+                elif HAS_MSVCRT and ch in _KEY_WIN_PREFIXES:
+                    read_byte()  # Drop the key code that follows
+                elif ch not in _CONTROL_BYTES:
+                    line += ch
+                    echo += ch
+            write_frame(echo + b"\r\n")
+            return line.decode("utf-8", "ignore" if HAS_MSVCRT else "replace")
         
         def set_status(message: str):
             """Set status message"""
@@ -4073,8 +5275,12 @@ class Commands:
                 # Ensure parent directory exists
                 filepath.parent.mkdir(parents=True, exist_ok=True)
                 
-                # Write content
-                filepath.write_text('\n'.join(content_lines), encoding='utf-8')
+                # Write content straight from the buffer, without joining it first
+                fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+                try:
+                    doc.write_to(fd)
+                finally:
+                    os.close(fd)
                 modified = False
                 set_status(f"✓ Saved to {filepath}")
                 return True
@@ -4084,8 +5290,10 @@ class Commands:
         
         def run_script():
             """Run the current script"""
-            nonlocal modified, filepath, content_lines
+            nonlocal modified, filepath, last_frame
             
+            # The script and any prompts write below the frame, so repaint it afterwards
+            last_frame = None
             if modified:
                 if not confirm_destructive_action("save before running (unsaved changes will be lost)"):
                     set_status("Run cancelled")
@@ -4097,10 +5305,11 @@ class Commands:
             
             set_status("Running script...")
             display_editor()
+            last_frame = None
             
             try:
                 # Run the script
-                content = '\n'.join(content_lines)
+                content = doc.getvalue().decode('utf-8')
                 lines = content.splitlines()
                 
                 # Save context
@@ -4111,7 +5320,7 @@ class Commands:
                 try:
                     State.script_file = str(filepath)
                     State.script_dir = str(filepath.parent)
-                    State.script_args = []
+                    State.script_args = ()
                     
                     print("\n" + "="*80)
                     print(f"Running: {filepath.name}")
@@ -4128,285 +5337,143 @@ class Commands:
                 set_status(f"✗ Run failed: {e}")
                 wait_for_any_key("Press any key to continue...")
         
+        def quit_editor():
+            """Leave the editor, confirming first when there are unsaved changes"""
+            nonlocal editing, last_frame
+            if modified:
+                last_frame = None
+                if not cooked(confirm_destructive_action, "quit without saving"):
+                    return
+            editing = False
+        
+        def prompt_open():
+            """Ask for a file name and open it"""
+            nonlocal last_frame
+            last_frame = None
+            try:
+                new_file = raw_prompt("Open file: ").strip()
+                if new_file:
+                    open_file(new_file)
+            except Exception as e:
+                set_status(f"Error: {e}")
+        
+        def prompt_find():
+            """Ask for a search term and jump to its next match"""
+            nonlocal last_frame
+            last_frame = None
+            try:
+                search_term = raw_prompt("Find: ").strip()
+                if search_term:
+                    find_next(search_term)
+            except Exception as e:
+                set_status(f"Error: {e}")
+        
+        # Single-byte keys with a fixed action; anything else is typed text
+        key_handlers = dict.fromkeys(_BACKSPACE, delete_back)
+        # Windows reports Enter as CR only; a bare LF there is Ctrl+Enter
+        key_handlers.update(dict.fromkeys({b'\r'} if HAS_MSVCRT else _ENTER, insert_newline))
+        key_handlers.update({
+            b'\x13': save_file,  # Ctrl+S
+            b'\x12': functools.partial(cooked, run_script),  # Ctrl+R
+            b'\x11': quit_editor,  # Ctrl+Q
+            b'\x0f': prompt_open,  # Ctrl+O
+            b'\x06': prompt_find,  # Ctrl+F
+        })
+        
         def handle_input():
             """Handle keyboard input"""
-            nonlocal cursor_pos, cursor_col, content_lines, editing, modified, filepath, scroll_offset
+            nonlocal cursor_pos, cursor_col, editing, last_frame
             
             try:
                 # For cross-platform key reading
                 if HAS_MSVCRT:
                     # Windows
-                    ch = msvcrt.getch()
-                    if ch == b'\xe0':  # Extended key (arrows, etc.)
-                        ch2 = msvcrt.getch()
+                    ch = read_byte()
+                    if ch == _KEY_WIN_EXTENDED:  # Extended key (arrows, etc.)
+                        ch2 = read_byte()
                         if ch2 == b'H':  # Up arrow
-                            cursor_pos = max(0, cursor_pos - 1)
-                            cursor_col = min(cursor_col, len(content_lines[cursor_pos]) if cursor_pos < len(content_lines) else 0)
+                            move_to_line(max(0, cursor_pos - 1))
                         elif ch2 == b'P':  # Down arrow
-                            cursor_pos = min(len(content_lines), cursor_pos + 1)
-                            cursor_col = min(cursor_col, len(content_lines[cursor_pos]) if cursor_pos < len(content_lines) else 0)
+                            move_to_line(min(doc.line_count() - 1, cursor_pos + 1))
                         elif ch2 == b'K':  # Left arrow
-                            cursor_col = max(0, cursor_col - 1)
+                            cursor_col = clamp_col(cursor_col - 1)
                         elif ch2 == b'M':  # Right arrow
-                            current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                            cursor_col = min(len(current_line), cursor_col + 1)
+                            move_right()
+                        return
+                    elif ch == _KEY_ESC:  # Escape
+                        # Swallow a function key that follows; nothing is bound to them yet
+                        if win_wait_key(100) == b'\x00':
+                            win_wait_key(100)
                         return
-                    elif ch == b'\r':  # Enter/Return
-                        # Insert new line
-                        current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                        before_cursor = current_line[:cursor_col]
-                        after_cursor = current_line[cursor_col:]
-                        
-                        if cursor_pos >= len(content_lines):
-                            content_lines.append(before_cursor)
-                            content_lines.append(after_cursor)
-                        else:
-                            content_lines[cursor_pos] = before_cursor
-                            content_lines.insert(cursor_pos + 1, after_cursor)
-                        
-                        cursor_pos += 1
-                        cursor_col = 0
-                        modified = True
-                    elif ch == b'\x08' or ch == b'\x7f':  # Backspace
-                        if cursor_col > 0:
-                            # Delete character before cursor
-                            current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                            content_lines[cursor_pos] = current_line[:cursor_col-1] + current_line[cursor_col:]
-                            cursor_col -= 1
-                            modified = True
-                        elif cursor_pos > 0:
-                            # Merge with previous line
-                            prev_line = content_lines[cursor_pos - 1]
-                            current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                            content_lines[cursor_pos - 1] = prev_line + current_line
-                            del content_lines[cursor_pos]
-                            cursor_pos -= 1
-                            cursor_col = len(prev_line)
-                            modified = True
-                    elif ch == b'\x1b':  # Escape
-                        # Check for Ctrl+ combinations
-                        try:
-                            ch2 = msvcrt.getch(timeout=0.1)
-                            if ch2 == b'\x00':
-                                ch3 = msvcrt.getch(timeout=0.1)
-                                # Handle function keys if needed
-                                pass
-                        except:
-                            pass
-                    else:
-                        # Regular character
-                        char = ch.decode('utf-8', errors='ignore')
-                        
-                        # Check for Ctrl+key combinations
-                        if ch == b'\x13':  # Ctrl+S (Save)
-                            save_file()
-                        elif ch == b'\x12':  # Ctrl+R (Run)
-                            run_script()
-                        elif ch == b'\x11':  # Ctrl+Q (Quit)
-                            if modified:
-                                if confirm_destructive_action("quit without saving"):
-                                    editing = False
-                            else:
-                                editing = False
-                        elif ch == b'\x0f':  # Ctrl+O (Open)
-                            try:
-                                termios_available = HAS_UNIX_TERM
-                                if termios_available:
-                                    fd = sys.stdin.fileno()
-                                    old_settings = termios.tcgetattr(fd)
-                                    termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-                                
-                                new_file = input("Open file: ").strip()
-                                
-                                if termios_available:
-                                    tty.setraw(fd)
-                                
-                                if new_file:
-                                    # Switch to new file
-                                    filepath = resolve_path(new_file)
-                                    if filepath.exists():
-                                        content = filepath.read_text(encoding='utf-8')
-                                        content_lines = content.splitlines()
-                                        cursor_pos = 0
-                                        cursor_col = 0
-                                        scroll_offset = 0
-                                        modified = False
-                                        set_status(f"✓ Opened {filepath.name}")
-                                    else:
-                                        set_status(f"✗ File not found: {new_file}")
-                            except Exception as e:
-                                set_status(f"Error: {e}")
-                        elif ch == b'\x06':  # Ctrl+F (Find)
-                            try:
-                                termios_available = HAS_UNIX_TERM
-                                if termios_available:
-                                    fd = sys.stdin.fileno()
-                                    old_settings = termios.tcgetattr(fd)
-                                    termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-                                
-                                search_term = input("Find: ").strip()
-                                
-                                if termios_available:
-                                    tty.setraw(fd)
-                                
-                                if search_term:
-                                    found = False
-                                    for i in range(cursor_pos + 1, len(content_lines)):
-                                        if search_term in content_lines[i]:
-                                            cursor_pos = i
-                                            cursor_col = content_lines[i].find(search_term)
-                                            found = True
-                                            break
-                                    if not found:
-                                        set_status(f"✗ '{search_term}' not found")
-                            except Exception as e:
-                                set_status(f"Error: {e}")
-                        else:
-                            # Insert character
-                            if cursor_pos >= len(content_lines):
-                                content_lines.append(char)
-                            else:
-                                current_line = content_lines[cursor_pos]
-                                content_lines[cursor_pos] = current_line[:cursor_col] + char + current_line[cursor_col:]
-                            cursor_col += 1
-                            modified = True
                 
-                elif HAS_UNIX_TERM:
-                    # Unix/Linux - simplified implementation
-                    fd = sys.stdin.fileno()
-                    old_settings = termios.tcgetattr(fd)
-                    try:
-                        tty.setraw(fd)
-                        ch = sys.stdin.read(1)
-                        
-                        if ch == '\x1b':  # Escape sequence
-                            # Check for arrow keys
-                            ch2 = sys.stdin.read(1)
-                            if ch2 == '[':
-                                ch3 = sys.stdin.read(1)
-                                if ch3 == 'A':  # Up
-                                    cursor_pos = max(0, cursor_pos - 1)
-                                    cursor_col = min(cursor_col, len(content_lines[cursor_pos]) if cursor_pos < len(content_lines) else 0)
-                                elif ch3 == 'B':  # Down
-                                    cursor_pos = min(len(content_lines), cursor_pos + 1)
-                                    cursor_col = min(cursor_col, len(content_lines[cursor_pos]) if cursor_pos < len(content_lines) else 0)
-                                elif ch3 == 'C':  # Right
-                                    current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                                    cursor_col = min(len(current_line), cursor_col + 1)
-                                elif ch3 == 'D':  # Left
-                                    cursor_col = max(0, cursor_col - 1)
-                        elif ch == '\r' or ch == '\n':  # Enter
-                            current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                            before_cursor = current_line[:cursor_col]
-                            after_cursor = current_line[cursor_col:]
-                            
-                            if cursor_pos >= len(content_lines):
-                                content_lines.append(before_cursor)
-                                content_lines.append(after_cursor)
-                            else:
-                                content_lines[cursor_pos] = before_cursor
-                                content_lines.insert(cursor_pos + 1, after_cursor)
-                            
-                            cursor_pos += 1
-                            cursor_col = 0
-                            modified = True
-                        elif ch == '\x7f' or ch == '\x08':  # Backspace
-                            if cursor_col > 0:
-                                current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                                content_lines[cursor_pos] = current_line[:cursor_col-1] + current_line[cursor_col:]
-                                cursor_col -= 1
-                                modified = True
-                            elif cursor_pos > 0:
-                                prev_line = content_lines[cursor_pos - 1]
-                                current_line = content_lines[cursor_pos] if cursor_pos < len(content_lines) else ""
-                                content_lines[cursor_pos - 1] = prev_line + current_line
-                                del content_lines[cursor_pos]
-                                cursor_pos -= 1
-                                cursor_col = len(prev_line)
-                                modified = True
-                        elif ch == '\x13':  # Ctrl+S
-                            save_file()
-                        elif ch == '\x12':  # Ctrl+R
-                            run_script()
-                        elif ch == '\x11':  # Ctrl+Q
-                            if modified:
-                                if confirm_destructive_action("quit without saving"):
-                                    editing = False
-                            else:
-                                editing = False
-                        elif ch == '\x0f':  # Ctrl+O
-                            try:
-                                termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-                                new_file = input("Open file: ").strip()
-                                tty.setraw(fd)
-                                if new_file:
-                                    filepath = resolve_path(new_file)
-                                    if filepath.exists():
-                                        content = filepath.read_text(encoding='utf-8')
-                                        content_lines = content.splitlines()
-                                        cursor_pos = 0
-                                        cursor_col = 0
-                                        scroll_offset = 0
-                                        modified = False
-                                        set_status(f"✓ Opened {filepath.name}")
-                                    else:
-                                        set_status(f"✗ File not found: {new_file}")
-                            except Exception as e:
-                                set_status(f"Error: {e}")
-                                tty.setraw(fd)
-                        elif ch == '\x06':  # Ctrl+F
-                            try:
-                                termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-                                search_term = input("Find: ").strip()
-                                tty.setraw(fd)
-                                if search_term:
-                                    found = False
-                                    for i in range(cursor_pos + 1, len(content_lines)):
-                                        if search_term in content_lines[i]:
-                                            cursor_pos = i
-                                            cursor_col = content_lines[i].find(search_term)
-                                            found = True
-                                            break
-                                    if not found:
-                                        set_status(f"✗ '{search_term}' not found")
-                            except Exception as e:
-                                set_status(f"Error: {e}")
-                                tty.setraw(fd)
-                        else:
-                            # Insert character
-                            if cursor_pos >= len(content_lines):
-                                content_lines.append(ch)
-                            else:
-                                current_line = content_lines[cursor_pos]
-                                content_lines[cursor_pos] = current_line[:cursor_col] + ch + current_line[cursor_col:]
-                            cursor_col += 1
-                            modified = True
-                            
-                    finally:
-                        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+                elif raw_settings is not None:
+                    # Unix/Linux - simplified implementation; the terminal is already raw
+                    ch = read_byte()
+                    
+                    if ch == _KEY_ESC:  # Escape sequence
+                        # Check for arrow keys
+                        seq = read_csi()
+                        if seq == b'[A':  # Up
+                            move_to_line(max(0, cursor_pos - 1))
+                        elif seq == b'[B':  # Down
+                            move_to_line(min(doc.line_count() - 1, cursor_pos + 1))
+                        elif seq == b'[C':  # Right
+                            move_right()
+                        elif seq == b'[D':  # Left
+                            cursor_col = clamp_col(cursor_col - 1)
+                        return
                 
                 else:
                     # Fallback: simple line-based editor
                     set_status(f"Advanced editor not available on this platform")
                     time.sleep(2)
                     editing = False
+                    return
+                
+                handler = key_handlers.get(ch)
+                if handler:
+                    handler()
+                else:
+                    # Insert the character plus anything pasted after it in one edit
+                    text = read_text_run(ch)
+                    if text:
+                        insert_text(text.encode('utf-8'))
                     
             except KeyboardInterrupt:
                 # Handle Ctrl+C
-                if confirm_destructive_action("exit editor"):
+                last_frame = None
+                if cooked(confirm_destructive_action, "exit editor"):
                     editing = False
             except Exception as e:
                 set_status(f"Input error: {e}")
         
         # Main editor loop
+        prev_winch = None
+        if hasattr(signal, "SIGWINCH"):
+            try:
+                prev_winch = signal.signal(signal.SIGWINCH, on_resize)
+            except ValueError:
+                # Not on the main thread; keep the size read at startup
+                pass
         try:
+            if term_fd is not None:
+                # Raw input, but keep output processing so frames can end lines with a plain newline
+                tty.setraw(term_fd)
+                raw_settings = termios.tcgetattr(term_fd)
+                raw_settings[1] = cooked_settings[1]
+                termios.tcsetattr(term_fd, termios.TCSADRAIN, raw_settings)
+            display_editor()
+            last_draw = time.monotonic()
             while editing:
-                display_editor()
                 handle_input()
+                # Skip frames that queued input would overwrite straight away
+                if editing and (not key_waiting() or time.monotonic() - last_draw >= _IDE_REDRAW_INTERVAL):
+                    display_editor()
+                    last_draw = time.monotonic()
             
             # Save on exit if modified
             if modified:
-                if confirm_destructive_action("save before exiting"):
+                if cooked(confirm_destructive_action, "save before exiting"):
                     save_file()
             
             print(f"\nExited editor. File: {filepath}")
@@ -4415,6 +5482,11 @@ class Commands:
         except Exception as e:
             print(f"\n⚠ Editor error: {e}")
             set_last_exit(1)
+        finally:
+            if raw_settings is not None:
+                termios.tcsetattr(term_fd, termios.TCSADRAIN, cooked_settings)
+            if prev_winch is not None:
+                signal.signal(signal.SIGWINCH, prev_winch)
 
     @staticmethod
     def case(args: List[str]) -> None:
@@ -4472,6 +5544,23 @@ class Commands:
         """Break from loop/case by raising BreakException"""
         raise BreakException()
 
+# Undo/redo handlers by action "op"
+UNDO_HANDLERS = {
+    "mk_file": Commands._undo_mk_file,
+    "mk_dir": Commands._undo_mk_dir,
+    "dlt": Commands._undo_dlt,
+    "cpy": Commands._undo_cpy,
+    "move": Commands._undo_move,
+}
+
+REDO_HANDLERS = {
+    "mk_file": Commands._redo_mk_file,
+    "mk_dir": Commands._redo_mk_dir,
+    "dlt": Commands._redo_dlt,
+    "cpy": Commands._redo_cpy,
+    "move": Commands._redo_move,
+}
+
 # Command registry
 COMMAND_REGISTRY = {
     "help": Commands.help,
@@ -4548,22 +5637,51 @@ COMMAND_REGISTRY = {
     "fnrm": FunctionCommands.fnrm,
 }
 
+# Commands whose runs are not written to the execution log
+SKIP_LOGGING = frozenset(('log', 'undo', 'redo', 'pse', 'wait'))
+
+# Opcodes of compiled script ops; each op is a tuple starting with its opcode
+OP_NOP, OP_EXEC, OP_GOTO, OP_IF, OP_RPT, OP_CASE, OP_BRK, OP_FAIL, OP_ABORT = range(9)
+
 # ============================================================================
 # INTERPRETER
 # ============================================================================
 
+class ExecCtx:
+    """Per-run state of a compiled program"""
+    __slots__ = ("script_name", "break_flag")
+
+    def __init__(self, script_name: str = ""):
+        self.script_name = script_name
+        self.break_flag = False  # set by a brk op to end the program
+
+def _to_number(value: Any):
+    """Convert a condition operand to float if it has a dot, else int"""
+    value = str(value)
+    return float(value) if "." in value else int(value)
+
 class Interpreter:
     """Script interpreter with control flow"""
 
     LABEL_RE = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*):')
+    # Compiled programs keyed by their source lines; running the same lines again (repeated
+    # includes and scripts) skips comment stripping, tokenizing and block scans. rpt and
+    # case bodies are compiled into their parent op and never go through this cache
+    _programs: Dict[Tuple[str, ...], List[tuple]] = {}
+    PROGRAM_CACHE_SIZE = 256
+    # Index returned by an op handler to stop the program
+    _STOP = sys.maxsize
+    # Operators of inline if conditions
+    EQUALITY_OPS = {"==": operator.eq, "=": operator.eq, "!=": operator.ne}
+    NUMERIC_OPS = {"<": operator.lt, ">": operator.gt, "<=": operator.le, ">=": operator.ge}
 
     @staticmethod
     def _build_label_map(lines: List[str]) -> Dict[str, int]:
-        """Scan lines for labels of form `name:` and return mapping to line index to jump to."""
+        """Scan stripped lines for labels of form `name:` and return mapping to line index to jump to."""
         labels: Dict[str, int] = {}
-        for idx, raw in enumerate(lines):
-            line = raw.strip()
-            m = Interpreter.LABEL_RE.match(line)
+        for idx, line in enumerate(lines):
+            # every label ends in ':', so lines without one skip the regex
+            m = ":" in line and Interpreter.LABEL_RE.match(line)
             if m:
                 name = m.group(1)
                 # label points to next line (so a goto jumps to the first line after label)
@@ -4574,414 +5692,404 @@ class Interpreter:
     def _execute_line(raw_line: str, from_script: bool = False) -> None:
         """Execute a single (non-empty) line after expansion."""
         # Expand aliases and variables before tokenizing for actual execution
-        expanded_line = TextProcessor.expand_aliases_and_vars(raw_line)
-        tokens = TextProcessor.tokenize(expanded_line)
-        if not tokens:
-            return
+        tokens = TextProcessor.expand_and_tokenize(raw_line)
+        if tokens:
+            Interpreter._execute_tokens(tokens, raw_line, from_script)
 
+    @staticmethod
+    def _execute_tokens(tokens: Tuple[str, ...], raw_line: str, from_script: bool = False) -> None:
+        """Execute already expanded tokens; raw_line is what gets logged."""
         cmd = tokens[0]
-        args = tokens[1:]
+        args = list(tokens[1:])
 
-        # Skip logging for certain commands
-        skip_logging_commands = ['log', 'undo', 'redo', 'pse', 'wait']
-        
         # direct registry command
         handler = COMMAND_REGISTRY.get(cmd)
         if handler:
+            log = cmd not in SKIP_LOGGING and not State.loading_rc
+            exit_code = None  # stays None on KeyboardInterrupt, which is not logged
             try:
                 handler(args)
-                # Log the execution
-                if cmd not in skip_logging_commands and not State.loading_rc:
-                    ExecutionLogger.log_execution(
-                        "REPL" if not from_script else "CMD",
-                        raw_line.strip(),
-                        State.variables.get('last', 0)
-                    )
+                exit_code = State.last_exit
             except SystemExit as e:
-                # Log before exiting
-                if cmd not in skip_logging_commands and not State.loading_rc:
-                    ExecutionLogger.log_execution(
-                        "REPL" if not from_script else "CMD",
-                        raw_line.strip(),
-                        e.code if isinstance(e.code, int) else 0
-                    )
+                exit_code = e.code if isinstance(e.code, int) else 0
                 raise
-            except Exception as e:
-                # Log even on error
-                if cmd not in skip_logging_commands and not State.loading_rc:
-                    ExecutionLogger.log_execution(
-                        "REPL" if not from_script else "CMD",
-                        raw_line.strip(),
-                        State.variables.get('last', 1)
-                    )
+            except Exception:
+                exit_code = State.last_exit
                 raise
+            finally:
+                # Log the execution, even on error or exit
+                if log and exit_code is not None:
+                    ExecutionLogger.log_execution("CMD" if from_script else "REPL", raw_line.strip(), exit_code)
             return
 
         # fallback: try running as external command
         try:
             ShellRunner.run_and_print([cmd] + args)
-            # Log external command execution
-            if not State.loading_rc:
-                ExecutionLogger.log_execution(
-                    "EXT" if not from_script else "CMD",
-                    raw_line.strip(),
-                    State.variables.get('last', 0)
-                )
+            mode, exit_code = "EXT", State.last_exit
         except Exception as e:
-            print(f"⚠ Unknown command or failed to run: {cmd} ({e})")
-            set_last_exit(1)
-            # Log failed command
-            if not State.loading_rc:
-                ExecutionLogger.log_execution(
-                    "ERR" if not from_script else "CMD",
-                    raw_line.strip(),
-                    1
-                )
+            report_error(f"Unknown command or failed to run: {cmd} ({e})")
+            mode, exit_code = "ERR", 1
+        if not State.loading_rc:
+            ExecutionLogger.log_execution("CMD" if from_script else mode, raw_line.strip(), exit_code)
 
     @staticmethod
-    def _collect_block(lines: List[str], start_index: int, start_kw: str, end_kw: str) -> Tuple[List[str], int]:
-        """Collect block lines from start_index+1 until matching end_kw, handling nesting of same block type."""
-        block = []
+    def _collect_block(lines: List[str], stripped: List[str], start_index: int, start_kw: str, end_kw: str) -> Tuple[List[str], int]:
+        """Collect block lines from start_index+1 until matching end_kw, handling nesting of same block type.
+
+        stripped holds the same lines already stripped, so the scan never strips.
+        """
         depth = 0
-        i = start_index + 1
-        while i < len(lines):
-            l = lines[i].strip()
+        for i in range(start_index + 1, len(stripped)):
+            l = stripped[i]
             # detect nested start
             if l.startswith(start_kw):
                 depth += 1
-                block.append(lines[i])
             elif l == end_kw:
                 if depth == 0:
                     # found matching end for this start
-                    return block, i
-                else:
-                    depth -= 1
-                    block.append(lines[i])
-            else:
-                block.append(lines[i])
-            i += 1
+                    return lines[start_index + 1:i], i
+                depth -= 1
         # if we get here, matching end not found
         raise SigilError(f"Missing {end_kw} for {start_kw} starting at line {start_index+1}")
 
     @staticmethod
-    def run_lines(lines: List[str], from_rc: bool = False, script_name: str = "") -> None:
-        """Run multiple lines with block support"""
-        # Strip comments and keep original line structure
-        in_block_comment = False
-        cleaned_lines: List[str] = []
-        for raw_line in lines:
-            line = raw_line.rstrip("\n")
-            stripped, in_block_comment = TextProcessor.strip_comments(line, in_block_comment)
-            cleaned_lines.append(stripped)
+    def _compile_operand(text: str):
+        """Return a callable yielding the expanded operand; text without $ or \\ is returned as is"""
+        if "$" in text or "\\" in text:
+            return functools.partial(TextProcessor.expand_vars_in_string, text)
+        return lambda: text
 
-        label_map = Interpreter._build_label_map(cleaned_lines)
+    @staticmethod
+    def _compile_number(text: str):
+        """Return a callable yielding the operand as a number; literals are converted once"""
+        if "$" in text or "\\" in text:
+            return lambda: _to_number(TextProcessor.expand_vars_in_string(text))
+        try:
+            number = _to_number(text)
+        except ValueError:
+            return None
+        return lambda: number
 
-        index = 0
-        while index < len(cleaned_lines):
-            raw_line = cleaned_lines[index]
-            line = raw_line.strip()
+    @staticmethod
+    def _compile_condition(cond_tokens: Tuple[str, ...]):
+        """Compile the condition of an inline if (<value> or <left> <op> <right>) to a callable"""
+        if len(cond_tokens) == 1:
+            value = Interpreter._compile_operand(cond_tokens[0].strip('"'))
 
-            # Skip empty lines or label definitions
-            if not line:
-                index += 1
-                continue
-            if Interpreter.LABEL_RE.match(line):
-                index += 1
-                continue
+            def condition() -> bool:
+                try:
+                    return bool(value())
+                except Exception:
+                    return False
+            return condition
 
-            # Tokenize for control keywords
-            tokens = TextProcessor.tokenize(line)
-            if not tokens:
-                index += 1
-                continue
+        if len(cond_tokens) < 3:
+            return lambda: False
 
-            cmd = tokens[0]
+        left_text = cond_tokens[0].strip('"')
+        right_text = " ".join(cond_tokens[2:]).strip('"')
+        left = Interpreter._compile_operand(left_text)
+        right = Interpreter._compile_operand(right_text)
+        op = cond_tokens[1]
+        if op in Interpreter.EQUALITY_OPS:
+            compare = Interpreter.EQUALITY_OPS[op]
 
-            # GOTO handling
-            if cmd == "goto":
-                if len(tokens) >= 2:
-                    label = tokens[1]
-                    if label in label_map:
-                        index = label_map[label]
-                        continue
-                    else:
-                        print(f"⚠ Label not found: {label}")
-                        set_last_exit(1)
-                else:
-                    print("⚠ goto requires a label")
-                    set_last_exit(1)
-                index += 1
+            def condition() -> bool:
+                try:
+                    return compare(str(left()), str(right()))
+                except Exception:
+                    return False
+        elif op in Interpreter.NUMERIC_OPS:
+            compare = Interpreter.NUMERIC_OPS[op]
+            left_number = Interpreter._compile_number(left_text)
+            right_number = Interpreter._compile_number(right_text)
+            if left_number is None or right_number is None:
+                # a literal side that is not a number never compares
+                return lambda: False
+
+            def condition() -> bool:
+                try:
+                    return bool(compare(left_number(), right_number()))
+                except Exception:
+                    return False
+        else:
+            # unknown operator: operands are still expanded, the condition never holds
+            def condition() -> bool:
+                try:
+                    left()
+                    right()
+                except Exception:
+                    pass
+                return False
+        return condition
+
+    @staticmethod
+    def _parse_case(block_lines: List[str], stripped: List[str]) -> Tuple[List[Tuple[List[str], List[str]]], List[str]]:
+        """Split a case body into (values, lines) per when, plus the else lines, in one pass"""
+        whens = []
+        values = None
+        start = 0
+        for k, l in enumerate(stripped):
+            is_when = l.startswith("when ")
+            if not is_when and l != "else":
                 continue
+            # a when body runs until the next when/else
+            if values is not None:
+                whens.append((values, block_lines[start:k]))
+            if not is_when:
+                # everything after else, later whens included
+                return whens, block_lines[k + 1:]
+            values = l[5:].split()
+            start = k + 1
+        if values is not None:
+            whens.append((values, block_lines[start:]))
+        return whens, []
 
-            # RPT handling (inline or block)
-            if cmd == "rpt":
-                # Inline form: rpt <count|inf> <command...>
-                if len(tokens) >= 3:
-                    count_tok = tokens[1]
-                    try:
-                        if count_tok == "inf":
-                            count = None
-                        else:
-                            count = int(count_tok)
-                    except Exception:
-                        print("⚠ Invalid rpt count")
-                        set_last_exit(1)
-                        index += 1
-                        continue
+    @staticmethod
+    def _compile_line(cleaned_lines: List[str], stripped: List[str], index: int, label_map: Dict[str, int]) -> tuple:
+        """Parse one line into an op tuple; errors become ops so they surface when reached"""
+        line = stripped[index]
 
-                    # inline command to repeat
-                    inline_cmd = " ".join(tokens[2:])
-                    # FIX: Create block_lines from inline command
-                    block_lines = [inline_cmd]
-                    try:
-                        if count is None:
-                            # infinite until brk or Ctrl-C
-                            while True:
-                                try:
-                                    Interpreter.run_lines(block_lines, from_rc, script_name)
-                                except BreakException:
-                                    break
-                        else:
-                            for _ in range(count):
-                                try:
-                                    Interpreter.run_lines(block_lines, from_rc, script_name)
-                                except BreakException:
-                                    break
-                        set_last_exit(0)
-                    except KeyboardInterrupt:
-                        set_last_exit(130)
-                    index += 1
-                    continue
+        # Skip empty lines or label definitions
+        if not line or (":" in line and Interpreter.LABEL_RE.match(line)):
+            return (OP_NOP,)
 
-                # Block form: rpt <count|inf> ... endrpt
-                if len(tokens) >= 2:
-                    count_tok = tokens[1]
-                    try:
-                        if count_tok == "inf":
-                            count = None
-                        else:
-                            count = int(count_tok)
-                    except Exception:
-                        print("⚠ Invalid rpt count")
-                        set_last_exit(1)
-                        index += 1
-                        continue
+        # Tokenize for control keywords
+        tokens = TextProcessor.tokenize(line)
+        if not tokens:
+            return (OP_NOP,)
 
-                    # collect block lines
-                    try:
-                        block_lines, end_idx = Interpreter._collect_block(cleaned_lines, index, "rpt", "endrpt")
-                    except SigilError as e:
-                        print(f"⚠ {e}")
-                        set_last_exit(1)
-                        return
+        cmd = tokens[0]
 
-                    try:
-                        if count is None:
-                            # infinite
-                            while True:
-                                try:
-                                    Interpreter.run_lines(block_lines)
-                                except BreakException:
-                                    break
-                        else:
-                            for _ in range(count):
-                                try:
-                                    Interpreter.run_lines(block_lines)
-                                except BreakException:
-                                    break
-                        set_last_exit(0)
-                    except KeyboardInterrupt:
-                        set_last_exit(130)
-
-                    # jump past endrpt
-                    index = end_idx + 1
-                    continue
+        if cmd == "goto":
+            if len(tokens) < 2:
+                return (OP_FAIL, "goto requires a label")
+            target = label_map.get(tokens[1])
+            if target is None:
+                return (OP_FAIL, f"Label not found: {tokens[1]}")
+            return (OP_GOTO, target)
+
+        # rpt <count|inf> <command...>  or  rpt <count|inf> ... endrpt
+        if cmd == "rpt":
+            if len(tokens) < 2:
+                return (OP_FAIL, "Malformed rpt")
+            try:
+                count = None if tokens[1] == "inf" else int(tokens[1])
+            except Exception:
+                return (OP_FAIL, "Invalid rpt count")
+            if len(tokens) >= 3:
+                return (OP_RPT, count, Interpreter._compile_program([" ".join(tokens[2:])]), index + 1, True)
+            try:
+                block_lines, end_idx = Interpreter._collect_block(cleaned_lines, stripped, index, "rpt", "endrpt")
+            except SigilError as e:
+                return (OP_ABORT, str(e))
+            return (OP_RPT, count, Interpreter._compile_program(block_lines), end_idx + 1, False)
+
+        if cmd == "case":
+            if len(tokens) < 2:
+                return (OP_FAIL, "case requires a variable")
+            try:
+                block_lines, end_idx = Interpreter._collect_block(cleaned_lines, stripped, index, "case", "endcase")
+            except SigilError as e:
+                return (OP_ABORT, str(e))
+            whens, else_block = Interpreter._parse_case(block_lines, stripped[index + 1:end_idx])
+            # Map every when value to its body; the first when listing a value wins
+            table: Dict[str, List[tuple]] = {}
+            for values, block in whens:
+                program = Interpreter._compile_program(block)
+                for value in values:
+                    table.setdefault(value, program)
+            return (OP_CASE, tokens[1], table, Interpreter._compile_program(else_block), end_idx + 1)
+
+        # minimal if: if <left> <op> <right> then <command...>, e.g. if $x == 5 then say "yes"
+        if cmd == "if":
+            if "then" not in tokens:
+                return (OP_FAIL, "Malformed if: missing 'then'")
+            then_idx = tokens.index("then")
+            return (OP_IF, Interpreter._compile_condition(tuple(tokens[1:then_idx])), " ".join(tokens[then_idx + 1:]))
+
+        if cmd == "brk":
+            return (OP_BRK,)
+
+        return (OP_EXEC, line)
 
-                # malformed rpt
-                print("⚠ Malformed rpt")
-                set_last_exit(1)
-                index += 1
-                continue
+    @staticmethod
+    def _compile_program(lines: List[str]) -> List[tuple]:
+        """Compile lines to one op per line"""
+        # Strip comments and keep original line structure
+        in_block_comment = False
+        cleaned_lines: List[str] = []
+        for raw_line in lines:
+            line = raw_line.rstrip("\n")
+            stripped, in_block_comment = TextProcessor.strip_comments(line, in_block_comment)
+            cleaned_lines.append(stripped)
 
-            # CASE handling
-            if cmd == "case":
-                if len(tokens) < 2:
-                    print("⚠ case requires a variable")
-                    set_last_exit(1)
-                    index += 1
-                    continue
+        stripped = [line.strip() for line in cleaned_lines]
+        label_map = Interpreter._build_label_map(stripped)
+        return [Interpreter._compile_line(cleaned_lines, stripped, index, label_map)
+                for index in range(len(cleaned_lines))]
 
-                var_name = tokens[1]
-                var_value = str(State.variables.get(var_name, os.environ.get(var_name, "")))
+    @staticmethod
+    def _compile(lines: Tuple[str, ...]) -> List[tuple]:
+        """Compile lines, reusing the result for lines seen before"""
+        program = Interpreter._programs.get(lines)
+        if program is None:
+            program = Interpreter._compile_program(lines)
+            if len(Interpreter._programs) >= Interpreter.PROGRAM_CACHE_SIZE:
+                Interpreter._programs.clear()
+            Interpreter._programs[lines] = program
+        return program
+
+    # Op handlers get the op, the index of the following op and the ExecCtx, and
+    # return the index to continue at
 
-                # collect case block
-                try:
-                    block_lines, end_idx = Interpreter._collect_block(cleaned_lines, index, "case", "endcase")
-                except SigilError as e:
-                    print(f"⚠ {e}")
-                    set_last_exit(1)
-                    return
+    @staticmethod
+    def _op_nop(op: tuple, index: int, ctx: ExecCtx) -> int:
+        return index
 
-                # parse when / else blocks
-                chosen_block: List[str] = []
-                current_when_values = []
-                collecting = False
-                else_block: List[str] = []
-                i = 0
-                while i < len(block_lines):
-                    l = block_lines[i].strip()
-                    if l.startswith("when "):
-                        # start of when
-                        collecting = True
-                        # parse values
-                        vals = l[5:].split()
-                        current_when_values = vals
-                        # collect lines until next when/else/endcase
-                        j = i + 1
-                        buff = []
-                        while j < len(block_lines):
-                            lj = block_lines[j].strip()
-                            if lj.startswith("when ") or lj == "else":
-                                break
-                            buff.append(block_lines[j])
-                            j += 1
-                        # if any match, choose this buff
-                        if var_value in current_when_values:
-                            chosen_block = buff
-                            break
-                        i = j
-                        continue
-                    elif l == "else":
-                        # collect else block
-                        j = i + 1
-                        buff = []
-                        while j < len(block_lines):
-                            buff.append(block_lines[j])
-                            j += 1
-                        else_block = buff
-                        break
-                    else:
-                        i += 1
+    @staticmethod
+    def _op_exec(op: tuple, index: int, ctx: ExecCtx) -> int:
+        # Regular command execution — may raise BreakException from inside subcommands
+        try:
+            Interpreter._execute_line(op[1], from_script=bool(ctx.script_name))
+        except (BreakException, SystemExit):
+            # brk outside a rpt block and exits propagate upward
+            raise
+        except Exception as e:
+            # don't crash entire interpreter for a single command; report and continue
+            report_error(f"Error executing line '{op[1]}': {e}")
+        return index
 
-                if not chosen_block and else_block:
-                    chosen_block = else_block
+    @staticmethod
+    def _op_goto(op: tuple, index: int, ctx: ExecCtx) -> int:
+        return op[1]
 
-                if chosen_block:
-                    try:
-                        Interpreter.run_lines(chosen_block)
-                        set_last_exit(0)
-                    except BreakException:
-                        # silently handle break
-                        pass
+    @staticmethod
+    def _op_if(op: tuple, index: int, ctx: ExecCtx) -> int:
+        if op[1]():
+            Interpreter._execute_line(op[2])
+        return index
 
-                index = end_idx + 1
-                continue
+    @staticmethod
+    def _op_rpt(op: tuple, index: int, ctx: ExecCtx) -> int:
+        _, count, body, next_index, inline = op
+        # The inline form runs as part of the script; a block body runs on its own
+        body_ctx = ExecCtx(ctx.script_name if inline else "")
+        try:
+            # A brk op in the body sets the flag; one raised by a command (e.g. from an
+            # inline if) arrives as BreakException. Either ends the whole loop
+            try:
+                if count is None:
+                    # infinite until brk or Ctrl-C
+                    while True:
+                        Interpreter._run(body, body_ctx)
+                        if body_ctx.break_flag:
+                            break
+                else:
+                    for _ in range(count):
+                        Interpreter._run(body, body_ctx)
+                        if body_ctx.break_flag:
+                            break
+            except BreakException:
+                pass
+            set_last_exit(0)
+        except KeyboardInterrupt:
+            set_last_exit(130)
+        return next_index
 
-            # 'if' inline handling: if <cond> then <command>
-            if cmd == "if":
-                # minimal if implementation supporting: if <left> <op> <right> then <command...>
-                # Example: if $x == 5 then say "yes"
-                # Tokenization already performed, so tokens[1:] includes condition and then 'then'
-                if "then" not in tokens:
-                    print("⚠ Malformed if: missing 'then'")
-                    set_last_exit(1)
-                    index += 1
-                    continue
-                then_idx = tokens.index("then")
-                cond_tokens = tokens[1:then_idx]
-                cmd_tokens = tokens[then_idx + 1:]
-                # Evaluate simple condition: left op right
-                cond_ok = False
-                try:
-                    if len(cond_tokens) == 1:
-                        left = TextProcessor.expand_vars_in_string(cond_tokens[0].strip('"'))
-                        cond_ok = bool(left)
-                    elif len(cond_tokens) >= 3:
-                        left = TextProcessor.expand_vars_in_string(cond_tokens[0].strip('"'))
-                        op = cond_tokens[1]
-                        right = TextProcessor.expand_vars_in_string(" ".join(cond_tokens[2:]).strip('"'))
-                        if op == "==" or op == "=":
-                            cond_ok = str(left) == str(right)
-                        elif op == "!=":
-                            cond_ok = str(left) != str(right)
-                        elif op in ("<", ">", "<=", ">="):
-                            try:
-                                cond_ok = float(left) if "." in str(left) else int(left)
-                                right_n = float(right) if "." in str(right) else int(right)
-                                if op == "<":
-                                    cond_ok = cond_ok < right_n
-                                elif op == ">":
-                                    cond_ok = cond_ok > right_n
-                                elif op == "<=":
-                                    cond_ok = cond_ok <= right_n
-                                elif op == ">=":
-                                    cond_ok = cond_ok >= right_n
-                            except Exception:
-                                cond_ok = False
-                        else:
-                            cond_ok = False
-                    else:
-                        cond_ok = False
-                except Exception:
-                    cond_ok = False
+    @staticmethod
+    def _op_case(op: tuple, index: int, ctx: ExecCtx) -> int:
+        _, var_name, table, else_program, next_index = op
+        variables = State.variables
+        if var_name in variables:
+            var_value = str(variables[var_name])
+        else:
+            var_value = os.environ.get(var_name, "")
+        chosen = table.get(var_value, else_program)
+        if chosen:
+            try:
+                # a brk in the body only ends the body
+                Interpreter._run(chosen, ExecCtx(""))
+                set_last_exit(0)
+            except BreakException:
+                # silently handle break
+                pass
+        return next_index
 
-                if cond_ok:
-                    try:
-                        Interpreter._execute_line(" ".join(cmd_tokens))
-                    except BreakException:
-                        raise
-                index += 1
-                continue
+    @staticmethod
+    def _op_brk(op: tuple, index: int, ctx: ExecCtx) -> int:
+        # stop this program; the enclosing rpt or run_lines checks the flag
+        ctx.break_flag = True
+        return Interpreter._STOP
 
-            # Handle brk spelled as command (so 'brk' on a line behaves like BreakException)
-            if cmd == "brk":
-                # 'brk' executed outside of loop => raise BreakException for caller to handle
-                raise BreakException()
+    @staticmethod
+    def _op_fail(op: tuple, index: int, ctx: ExecCtx) -> int:
+        report_error(op[1])
+        return index
 
-            # Regular command execution — may raise BreakException from inside subcommands
-            try:
-                Interpreter._execute_line(line, from_script=bool(script_name))
-            except BreakException:
-                # If brk encountered outside a rpt block, propagate upward
-                raise
-            except SystemExit:
-                # pass through exits
-                raise
-            except Exception as e:
-                # don't crash entire interpreter for a single command; report and continue
-                print(f"⚠ Error executing line '{line}': {e}")
-                set_last_exit(1)
+    @staticmethod
+    def _op_abort(op: tuple, index: int, ctx: ExecCtx) -> int:
+        report_error(op[1])
+        return Interpreter._STOP
 
-            index += 1
+    @staticmethod
+    def _run(program: List[tuple], ctx: ExecCtx) -> None:
+        """Execute a compiled program; each op handler returns the index of the next op"""
+        ctx.break_flag = False
+        dispatch = Interpreter._DISPATCH
+        index = 0
+        end = len(program)
+        while index < end:
+            op = program[index]
+            index = dispatch[op[0]](op, index + 1, ctx)
+
+    @staticmethod
+    def run_lines(lines: List[str], from_rc: bool = False, script_name: str = "") -> None:
+        """Run multiple lines with block support"""
+        ctx = ExecCtx(script_name)
+        Interpreter._run(Interpreter._compile(tuple(lines)), ctx)
+        if ctx.break_flag:
+            # 'brk' executed outside of loop => raise BreakException for caller to handle
+            raise BreakException()
+
+# Op handlers indexed by opcode
+Interpreter._DISPATCH = (
+    Interpreter._op_nop, Interpreter._op_exec, Interpreter._op_goto, Interpreter._op_if,
+    Interpreter._op_rpt, Interpreter._op_case, Interpreter._op_brk, Interpreter._op_fail,
+    Interpreter._op_abort,
+)
 
 # ============================================================================
 # REPL / MAIN
 # ============================================================================
 
+def _spawn_update_check() -> None:
+    """Run a silent update check in a background thread so startup is not blocked"""
+    try:
+        threading.Thread(
+            target=UpdateChecker.check_for_updates,
+            kwargs={'silent': True, 'force_check': False},
+            daemon=True
+        ).start()
+    except RuntimeError:
+        # no thread could be started; skip the update check
+        pass
+
 def repl():
     """Simple interactive read-eval-print loop for Sigil with logging"""
     RCManager.load()
     print(f"Sigil {Config.VERSION} — Type 'help' for commands. Ctrl-D or 'exit' to quit.")
     
     # Check for updates on startup (once per session)
-    try:
-        # Run update check in background to not block startup
-        import threading
-        update_thread = threading.Thread(
-            target=UpdateChecker.check_for_updates,
-            kwargs={'silent': True, 'force_check': False},
-            daemon=True
-        )
-        update_thread.start()
-    except Exception:
-        # If threading fails, just skip the update check
-        pass
+    _spawn_update_check()
     
     # Log REPL start
     ExecutionLogger.log_execution("REPL", "REPL started", 0)
     
     try:
         while True:
+            # Keep the log current while the REPL waits for input
+            ExecutionLogger.flush()
             try:
                 raw = input("> ")
             except EOFError:
@@ -5026,19 +6134,6 @@ def main():
     # Load RC profile
     RCManager.load()
     
-    # Check for updates on startup (only in interactive mode)
-    if len(sys.argv) <= 1:  # Only in REPL mode, not when running scripts
-        try:
-            import threading
-            update_thread = threading.Thread(
-                target=UpdateChecker.check_for_updates,
-                kwargs={'silent': True, 'force_check': False},
-                daemon=True
-            )
-            update_thread.start()
-        except Exception:
-            pass
-    
     # Check if we were given a script file as argument
     if len(sys.argv) > 1:
         # First argument is the .sig file
@@ -5057,7 +6152,7 @@ def main():
         script_path = Path(script_file).resolve()
         State.script_file = str(script_path)
         State.script_dir = str(script_path.parent)
-        State.script_args = sys.argv[2:]  # Additional arguments
+        State.script_args = tuple(sys.argv[2:])  # Additional arguments
         
         # Change to script's directory
         original_dir = State.current_dir
@@ -5067,9 +6162,9 @@ def main():
             # Log script execution start
             ExecutionLogger.log_execution("SCRIPT", str(script_path), 0)
             
-            # Read and execute the script
-            content = script_path.read_text(encoding="utf-8")
-            lines = content.splitlines()
+            # Read and execute the script; lines keep their "\n", which compiling strips
+            with script_path.open("r", encoding="utf-8") as script:
+                lines = tuple(script)
             
             print(f"🔮 Running: {script_path.name}")
             print("=" * 60)
@@ -5077,7 +6172,7 @@ def main():
             Interpreter.run_lines(lines, script_name=str(script_path))
             
             print("=" * 60)
-            exit_code = State.variables.get('last', 0)
+            exit_code = State.last_exit
             print(f"✓ Script completed. Exit code: {exit_code}")
             
             # Log script execution completion
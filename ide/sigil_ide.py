@@ -12,9 +12,10 @@ import re
 import sys
 import shutil
 import tempfile
+from collections import OrderedDict
 from pathlib import Path
 
-from PySide6.QtCore import Qt, QProcess, QSize
+from PySide6.QtCore import Qt, QByteArray, QProcess, QSize, QTimer, Signal
 from PySide6.QtGui import (
     QAction,
     QColor,
@@ -37,7 +38,6 @@ from PySide6.QtWidgets import (
     QPlainTextEdit,
     QSplitter,
     QStatusBar,
-    QTextEdit,
     QToolBar,
     QVBoxLayout,
     QWidget,
@@ -53,6 +53,10 @@ SIGIL_EXE_CANDIDATES = [
 
 SIGIL_CONFIG_DIR = Path(r"C:\Sigil")
 DEFAULT_FONT_FAMILY = "Consolas" if os.name == "nt" else "DejaVu Sans Mono"
+RECENT_FILES_CACHED = 8  # opened files whose text is kept for reopening
+# what QTextDocument.toPlainText() does to block text: nbsp becomes a space, and the
+# line/paragraph separators (Shift+Enter inserts U+2028) and frame markers become newlines
+PLAIN_TEXT_TABLE = str.maketrans({"\u00a0": " ", "\u2028": "\n", "\u2029": "\n", "\ufdd0": "\n", "\ufdd1": "\n"})
 
 NEON_COLORS = {
     "background": "#0b0f14aa",
@@ -67,50 +71,145 @@ NEON_COLORS = {
     "error": "#ff5555",
 }
 
+# built once at import; _apply_theme only hands it to Qt
+STYLE_SHEET = f"""
+    QMainWindow {{
+        background: {NEON_COLORS['background']};
+    }}
+    QToolBar {{
+        background: rgba(6,8,10,0.35);
+        border-bottom: 1px solid rgba(139,233,253,0.06);
+    }}
+    QToolButton {{
+        color: {NEON_COLORS['text']};
+        background: rgba(255,255,255,0.02);
+        border-radius: 6px;
+        padding: 6px 8px;
+        margin: 2px;
+    }}
+    QToolButton:hover {{
+        background: rgba(189,147,249,0.10);
+    }}
+    QPlainTextEdit {{
+        background: rgba(8,10,12,0.75);
+        color: {NEON_COLORS['text']};
+        padding: 6px;
+    }}
+    QPushButton {{
+        background: rgba(189,147,249,0.06);
+        color: {NEON_COLORS['text']};
+        border-radius: 6px;
+        padding: 4px 8px;
+    }}
+    QLabel {{
+        color: {NEON_COLORS['accent']};
+    }}
+"""
+
 # -------------------------
 # Syntax Highlighter
 # -------------------------
 class SigilHighlighter(QSyntaxHighlighter):
+    MAX_LINE = 16384  # characters highlighted per line
+    long_line = Signal(int)  # emitted once, the first time a line is cut at MAX_LINE
+    MARGIN = 50  # blocks highlighted past each edge of the visible ones
+    HIGHLIGHTED = 1  # block state once its formats are applied
+
     def __init__(self, parent):
         super().__init__(parent)
-        self.rules: list[tuple[re.Pattern, QTextCharFormat, int]] = []
+        self._warned_long_line = False
+        # block numbers to highlight; None highlights every block
+        self.window: tuple[int, int] | None = None
+        self.pattern: re.Pattern | None = None
+        self.string_vars: re.Pattern | None = None
+        self.formats: dict[str, QTextCharFormat] = {}
+        self._spans: dict[str, tuple[tuple[int, int, QTextCharFormat], ...]] = {}
         self._build_rules()
 
+    def set_window(self, first: int, last: int):
+        self.window = (max(first - self.MARGIN, 0), last + self.MARGIN)
+
     @staticmethod
     def _format(color: str, *, bold=False, italic=False) -> QTextCharFormat:
+        # set only weight and style; a whole QFont would also pin the default family
+        # and size over the editor's monospace font
         fmt = QTextCharFormat()
         fmt.setForeground(QColor(color))
-        font = QFont()
-        font.setBold(bold)
-        font.setItalic(italic)
-        fmt.setFont(font)
+        if bold:
+            fmt.setFontWeight(QFont.Bold)
+        if italic:
+            fmt.setFontItalic(True)
         return fmt
 
-    def _add_rule(self, pattern: str, fmt: QTextCharFormat, flags=re.IGNORECASE, group: int = 0):
-        self.rules.append((re.compile(pattern, flags), fmt, group))
-
     def _build_rules(self):
-        self._add_rule(
-            r"\b(mk|cpy|dlt|move|renm|cd|pwd|run|let|unset|var|if|fmt|schk)\b",
-            self._format(NEON_COLORS["command"], bold=True),
+        # one alternation of named groups, so each block is scanned once; the leftmost
+        # match wins and, at the same position, the earlier alternative
+        self.pattern = re.compile(
+            # 'let NAME': the keyword and the variable it assigns
+            r"(?P<let>\blet)\s+(?P<let_name>[A-Za-z_]\w*)"
+            r"|(?P<command>\b(?:mk|cpy|dlt|move|renm|cd|pwd|run|let|unset|var|if|fmt|schk)\b)"
+            # unrolled loop: no overlapping alternatives, so an unterminated string
+            # fails in linear time instead of backtracking
+            r'|(?P<string>"[^"\\]*(?:\\.[^"\\]*)*")'
+            r"|(?P<number>\b\d+(?:\.\d+)?\b)"
+            r"|(?P<variable>\$[A-Za-z_]\w*)"
+            r"|(?P<comment>//.*|#.*)"
+            r"|(?P<operator>==|!=|>=|<=|[=<>+\-*/])",
+            re.IGNORECASE,
         )
-        self._add_rule(r'"([^"\\]|\\.)*"', self._format(NEON_COLORS["string"]))
-        self._add_rule(r"\b\d+(\.\d+)?\b", self._format(NEON_COLORS["number"]))
-        self._add_rule(r"\$[A-Za-z_]\w*", self._format(NEON_COLORS["variable"], bold=True))
-        # avoid variable-width lookbehind by matching 'let NAME' and highlighting group 1
-        self._add_rule(r"\blet\s+([A-Za-z_]\w*)", self._format(NEON_COLORS["variable"], bold=True), group=1)
-        self._add_rule(r"//.*|#.*", self._format(NEON_COLORS["comment"]))
-        self._add_rule(r"(==|!=|>=|<=|=|>|<|\+|\-|\*|/)", self._format(NEON_COLORS["accent"]))
+        # Sigil expands $name inside double quotes, so those keep the variable colour
+        self.string_vars = re.compile(r"\$[A-Za-z_]\w*")
+        command = self._format(NEON_COLORS["command"], bold=True)
+        variable = self._format(NEON_COLORS["variable"], bold=True)
+        self.formats = {
+            "let": command,
+            "let_name": variable,
+            "command": command,
+            "string": self._format(NEON_COLORS["string"]),
+            "number": self._format(NEON_COLORS["number"]),
+            "variable": variable,
+            "comment": self._format(NEON_COLORS["comment"]),
+            "operator": self._format(NEON_COLORS["accent"]),
+        }
+
+    def _tokenize(self, text: str) -> tuple[tuple[int, int, QTextCharFormat], ...]:
+        # (start, length, format) spans of a block; repeated lines reuse the scan
+        spans = self._spans.get(text)
+        if spans is None:
+            formats = self.formats
+            found = []
+            for m in self.pattern.finditer(text):
+                kind = m.lastgroup
+                if kind == "let_name":
+                    found.append((m.start(), 3, formats["let"]))
+                start, end = m.span(kind)
+                found.append((start, end - start, formats[kind]))
+                if kind == "string":
+                    for v in self.string_vars.finditer(text, start + 1, end - 1):
+                        found.append((v.start(), v.end() - v.start(), formats["variable"]))
+            spans = tuple(found)
+            if len(self._spans) >= 4096:
+                self._spans.clear()
+            self._spans[text] = spans
+        return spans
 
     def highlightBlock(self, text: str):
-        for regex, fmt, group in self.rules:
-            for m in regex.finditer(text):
-                if group and m.lastindex and group <= m.lastindex:
-                    start, end = m.span(group)
-                else:
-                    start, end = m.span()
-                if start >= 0 and end > start:
-                    self.setFormat(start, end - start, fmt)
+        window = self.window
+        if window is not None and not window[0] <= self.currentBlock().blockNumber() <= window[1]:
+            # left unformatted until the editor scrolls it into view
+            self.setCurrentBlockState(-1)
+            return
+        self.setCurrentBlockState(self.HIGHLIGHTED)
+        if not text:
+            return
+        if len(text) > self.MAX_LINE:
+            # bound the scan on pathological lines; the rest stays unhighlighted
+            text = text[:self.MAX_LINE]
+            if not self._warned_long_line:
+                self._warned_long_line = True
+                self.long_line.emit(self.MAX_LINE)
+        for start, length, fmt in self._tokenize(text):
+            self.setFormat(start, length, fmt)
 
 
 # -------------------------
@@ -124,7 +223,21 @@ class SigilIDE(QMainWindow):
 
         self.current_file: Path | None = None
         self.process: QProcess | None = None
+        self._tool_proc: QProcess | None = None  # running fmt/schk, if any
         self._temp_run_file: Path | None = None  # if we wrote a temp file for run
+        # last found executable, keyed by (path override, PATH)
+        self._exe_cache: tuple[tuple[str, str], str] | None = None
+        # text of recently opened files, least recent first, keyed to their mtime
+        self._recent: OrderedDict[Path, tuple[int, str]] = OrderedDict()
+
+        # process output is collected here and appended by a short timer, not per read;
+        # QByteArray buffers take each read in C++ without creating a Python bytes object
+        self._out_buf = QByteArray()
+        self._err_buf = QByteArray()
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(40)
+        self._flush_timer.timeout.connect(self._flush_output)
 
         self._build_ui()
         self._apply_theme()
@@ -166,11 +279,28 @@ class SigilIDE(QMainWindow):
 
         self.editor = QPlainTextEdit()
         self.editor.setFont(QFont(DEFAULT_FONT_FAMILY, 11))
-        SigilHighlighter(self.editor.document())
+        self._highlighter = SigilHighlighter(self.editor.document())
+        self._highlighter.long_line.connect(
+            lambda limit: self.status.showMessage(f"Highlighting stops after {limit} characters on long lines", 5000)
+        )
+        # offscreen blocks are highlighted once they are scrolled into view
+        self._highlight_timer = QTimer(self)
+        self._highlight_timer.setSingleShot(True)
+        self._highlight_timer.setInterval(50)
+        self._highlight_timer.timeout.connect(self._highlight_visible)
+        scroll = self.editor.verticalScrollBar()
+        scroll.valueChanged.connect(self._schedule_highlight)
+        scroll.rangeChanged.connect(self._schedule_highlight)
+        self.editor.blockCountChanged.connect(self._schedule_highlight)
+        self._highlighter.set_window(*self._visible_blocks())
         splitter.addWidget(self.editor)
 
-        self.output = QTextEdit(readOnly=True)
+        self.output = QPlainTextEdit(readOnly=True)
         self.output.setFont(QFont(DEFAULT_FONT_FAMILY, 11))
+        # output formats indexed by the error flag of append_output
+        self.output_formats: tuple[QTextCharFormat, QTextCharFormat] = (QTextCharFormat(), QTextCharFormat())
+        self.output_formats[0].setForeground(QColor(NEON_COLORS["text"]))
+        self.output_formats[1].setForeground(QColor(NEON_COLORS["error"]))
         self.output.setFixedHeight(220)
         splitter.addWidget(self.output)
 
@@ -196,47 +326,14 @@ class SigilIDE(QMainWindow):
         self.act_save_as.triggered.connect(self.file_save_as)
         self.act_run.triggered.connect(self.run_current)
         self.act_stop.triggered.connect(self.stop_current)
-        self.act_fmt.triggered.connect(lambda: self._run_tool("fmt"))
-        self.act_schk.triggered.connect(lambda: self._run_tool("schk"))
+        self.act_fmt.triggered.connect(self._run_fmt)
+        self.act_schk.triggered.connect(self._run_schk)
         self.btn_choose_sigil.clicked.connect(self.choose_sigil_path)
+        self.sigil_path_edit.textChanged.connect(self._clear_exe_cache)
         self.btn_clear.clicked.connect(lambda: self.output.clear())
 
     def _apply_theme(self):
-        self.setStyleSheet(
-            f"""
-            QMainWindow {{
-                background: {NEON_COLORS['background']};
-            }}
-            QToolBar {{
-                background: rgba(6,8,10,0.35);
-                border-bottom: 1px solid rgba(139,233,253,0.06);
-            }}
-            QToolButton {{
-                color: {NEON_COLORS['text']};
-                background: rgba(255,255,255,0.02);
-                border-radius: 6px;
-                padding: 6px 8px;
-                margin: 2px;
-            }}
-            QToolButton:hover {{
-                background: rgba(189,147,249,0.10);
-            }}
-            QPlainTextEdit, QTextEdit {{
-                background: rgba(8,10,12,0.75);
-                color: {NEON_COLORS['text']};
-                padding: 6px;
-            }}
-            QPushButton {{
-                background: rgba(189,147,249,0.06);
-                color: {NEON_COLORS['text']};
-                border-radius: 6px;
-                padding: 4px 8px;
-            }}
-            QLabel {{
-                color: {NEON_COLORS['accent']};
-            }}
-            """
-        )
+        self.setStyleSheet(STYLE_SHEET)
 
     # -------------------------
     # File ops
@@ -285,7 +382,24 @@ class SigilIDE(QMainWindow):
 
     def _load_file(self, path: Path):
         try:
-            self.editor.setPlainText(path.read_text(encoding="utf-8"))
+            mtime = path.stat().st_mtime_ns
+            cached = self._recent.get(path)
+            if cached is not None and cached[0] == mtime:
+                text = cached[1]
+            else:
+                text = path.read_bytes().decode("utf-8", "replace")
+            self._recent[path] = (mtime, text)
+            self._recent.move_to_end(path)
+            if len(self._recent) > RECENT_FILES_CACHED:
+                self._recent.popitem(last=False)
+            # detach the highlighter while the text goes in; reattaching schedules one
+            # rehighlight from the event loop instead of highlighting during setPlainText
+            self._highlighter.setDocument(None)
+            try:
+                self.editor.setPlainText(text)
+                self._highlighter.set_window(*self._visible_blocks())
+            finally:
+                self._highlighter.setDocument(self.editor.document())
             self.current_file = path
             self.editor.document().setModified(False)
             self.setWindowTitle(f"Sigil IDE — {path.name}")
@@ -293,6 +407,28 @@ class SigilIDE(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Open failed", str(e))
 
+    # -------------------------
+    # Viewport highlighting
+    # -------------------------
+    def _visible_blocks(self) -> tuple[int, int]:
+        first = self.editor.firstVisibleBlock().blockNumber()
+        last = self.editor.cursorForPosition(self.editor.viewport().rect().bottomRight()).blockNumber()
+        return first, last
+
+    def _schedule_highlight(self):
+        if not self._highlight_timer.isActive():
+            self._highlight_timer.start()
+
+    def _highlight_visible(self):
+        highlighter = self._highlighter
+        highlighter.set_window(*self._visible_blocks())
+        first, last = highlighter.window
+        block = self.editor.document().findBlockByNumber(first)
+        while block.isValid() and block.blockNumber() <= last:
+            if block.userState() != SigilHighlighter.HIGHLIGHTED:
+                highlighter.rehighlightBlock(block)
+            block = block.next()
+
     # -------------------------
     # Profiles
     # -------------------------
@@ -301,9 +437,13 @@ class SigilIDE(QMainWindow):
         self.profile_combo.addItem("default")
         try:
             if SIGIL_CONFIG_DIR.exists():
-                for file in sorted(SIGIL_CONFIG_DIR.iterdir()):
-                    if file.is_file() and file.name.startswith(".sigilrc."):
-                        self.profile_combo.addItem(file.name.removeprefix(".sigilrc."))
+                # scandir entries carry the file type, so only symlinks need a stat
+                with os.scandir(SIGIL_CONFIG_DIR) as entries:
+                    names = sorted(
+                        entry.name.removeprefix(".sigilrc.") for entry in entries
+                        if entry.name.startswith(".sigilrc.") and entry.is_file()
+                    )
+                self.profile_combo.addItems(names)
             self.status.showMessage("Profiles loaded", 2000)
         except Exception as e:
             self.status.showMessage(f"Profile load error: {e}", 4000)
@@ -312,8 +452,19 @@ class SigilIDE(QMainWindow):
     # Sigil runtime helpers
     # -------------------------
     def find_sigil_exe(self) -> str | None:
-        # explicit override
         path_text = self.sigil_path_edit.text().strip()
+        key = (path_text, os.environ.get("PATH", ""))
+        if self._exe_cache and self._exe_cache[0] == key:
+            return self._exe_cache[1]
+        exe = self._resolve_sigil_exe(path_text)
+        # a miss is not cached, so installing Sigil later is picked up
+        if exe:
+            self._exe_cache = (key, exe)
+        return exe
+
+    @staticmethod
+    def _resolve_sigil_exe(path_text: str) -> str | None:
+        # explicit override
         if path_text:
             if Path(path_text).exists():
                 return path_text
@@ -331,10 +482,10 @@ class SigilIDE(QMainWindow):
         return None
 
     def append_output(self, text: str, error: bool = False):
-        color = NEON_COLORS["error"] if error else NEON_COLORS["text"]
-        self.output.moveCursor(QTextCursor.End)
-        safe = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-        self.output.insertHtml(f'<pre style="color:{color}; margin:0;">{safe}</pre>')
+        cursor = self.output.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text, self.output_formats[error])
+        self.output.setTextCursor(cursor)
         self.output.ensureCursorVisible()
 
     # -------------------------
@@ -347,11 +498,18 @@ class SigilIDE(QMainWindow):
 
         if self.current_file is None:
             # create temp file
-            tf = tempfile.NamedTemporaryFile(delete=False, suffix=".sig", prefix="sigil_run_")
-            tf.write(self.editor.toPlainText().encode("utf-8"))
-            tf.flush()
-            tf.close()
-            run_path = Path(tf.name)
+            fd, name = tempfile.mkstemp(suffix=".sig", prefix="sigil_run_")
+            # write block by block, so only one line at a time exists as a Python string;
+            # PLAIN_TEXT_TABLE makes the output match toPlainText
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                block = self.editor.document().firstBlock()
+                f.write(block.text().translate(PLAIN_TEXT_TABLE))
+                block = block.next()
+                while block.isValid():
+                    f.write("\n")
+                    f.write(block.text().translate(PLAIN_TEXT_TABLE))
+                    block = block.next()
+            run_path = Path(name)
             self._temp_run_file = run_path
             temp_used = True
             self.append_output(f"Saved editor to temporary file: {run_path}\n")
@@ -377,6 +535,8 @@ class SigilIDE(QMainWindow):
             return
 
         # clear output and show running header
+        self._out_buf.clear()
+        self._err_buf.clear()
         self.output.clear()
         self.append_output(f"Running: {exe} {run_path}\n")
 
@@ -426,24 +586,35 @@ class SigilIDE(QMainWindow):
     def stop_current(self):
         if self.process and self.process.state() == QProcess.Running:
             self.process.kill()
+            self._flush_output()
             self.append_output("\nProcess killed by user\n", error=True)
             self.status.showMessage("Process killed", 2000)
 
     def _on_stdout(self):
         if not self.process:
             return
-        data = self.process.readAllStandardOutput().data().decode(errors="ignore")
-        if data:
-            self.append_output(data)
+        self._out_buf.append(self.process.readAllStandardOutput())
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
 
     def _on_stderr(self):
         if not self.process:
             return
-        data = self.process.readAllStandardError().data().decode(errors="ignore")
-        if data:
-            self.append_output(data, error=True)
+        self._err_buf.append(self.process.readAllStandardError())
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush_output(self):
+        self._flush_timer.stop()
+        if not self._out_buf.isEmpty():
+            self.append_output(self._out_buf.data().decode(errors="ignore"))
+            self._out_buf.clear()
+        if not self._err_buf.isEmpty():
+            self.append_output(self._err_buf.data().decode(errors="ignore"), error=True)
+            self._err_buf.clear()
 
     def _on_finished(self, exit_code: int, exit_status: QProcess.ExitStatus):
+        self._flush_output()
         self.append_output(f"\nProcess finished (exit={exit_code})\n")
         self.status.showMessage(f"Process finished (exit={exit_code})", 3000)
         # cleanup temp file if used
@@ -458,6 +629,12 @@ class SigilIDE(QMainWindow):
     # -------------------------
     # Run fmt and schk using sigil runtime
     # -------------------------
+    def _run_fmt(self):
+        self._run_tool("fmt")
+
+    def _run_schk(self):
+        self._run_tool("schk")
+
     def _run_tool(self, verb: str):
         if self.current_file is None:
             QMessageBox.information(self, "No file", "Open or save a file first.")
@@ -471,11 +648,36 @@ class SigilIDE(QMainWindow):
         proc = QProcess(self)
         proc.setProgram(exe)
         proc.setArguments([verb, str(self.current_file)])
-        proc.readyReadStandardOutput.connect(lambda: self.append_output(proc.readAllStandardOutput().data().decode(errors="ignore")))
-        proc.readyReadStandardError.connect(lambda: self.append_output(proc.readAllStandardError().data().decode(errors="ignore"), True))
+        proc.readyReadStandardOutput.connect(self._on_tool_stdout)
+        proc.readyReadStandardError.connect(self._on_tool_stderr)
+        # report on completion instead of blocking the GUI until the tool exits
+        proc.finished.connect(lambda exit_code, _status: self._on_tool_finished(verb, proc, exit_code))
+        proc.errorOccurred.connect(lambda error: self._on_tool_error(verb, proc, error))
+        self._tool_proc = proc
         proc.start()
-        proc.waitForFinished()
-        self.append_output(f"\n{verb} finished (exit={proc.exitCode()})\n")
+
+    def _on_tool_stdout(self):
+        # sender, not self._tool_proc: an earlier tool may still be writing
+        proc = self.sender()
+        self.append_output(proc.readAllStandardOutput().data().decode(errors="ignore"))
+
+    def _on_tool_stderr(self):
+        proc = self.sender()
+        self.append_output(proc.readAllStandardError().data().decode(errors="ignore"), True)
+
+    def _on_tool_finished(self, verb: str, proc: QProcess, exit_code: int):
+        self.append_output(f"\n{verb} finished (exit={exit_code})\n")
+        if self._tool_proc is proc:
+            self._tool_proc = None
+        proc.deleteLater()
+
+    def _on_tool_error(self, verb: str, proc: QProcess, error: QProcess.ProcessError):
+        # a tool that never starts emits no finished signal
+        if error == QProcess.FailedToStart:
+            self.append_output(f"\n{verb} failed to start\n", error=True)
+            if self._tool_proc is proc:
+                self._tool_proc = None
+            proc.deleteLater()
 
     # -------------------------
     # Choose sigil exe path
@@ -485,6 +687,9 @@ class SigilIDE(QMainWindow):
         if path:
             self.sigil_path_edit.setText(path)
 
+    def _clear_exe_cache(self):
+        self._exe_cache = None
+
 # -------------------------
 # Run app
 # -------------------------